@@ -2,6 +2,7 @@
 ASGI config for ynvest_tube_server project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Server-sent events streams and ndjson exports are served directly, other requests by django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +14,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ynvest_tube_server.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after django setup
+from ynvest_tube_server.ynvest_tube_app.streams import auction_events, is_export, ndjson_export  # noqa: E402
+
+# paths served by plain ASGI applications, bypassing django
+STREAMS = {
+    "/auctions/events": auction_events,
+}
+
+
+async def application(scope, receive, send):
+    stream = None
+    if scope["type"] == "http":
+        stream = ndjson_export if is_export(scope) else STREAMS.get(scope["path"])
+    await (stream or django_application)(scope, receive, send)
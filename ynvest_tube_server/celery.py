@@ -9,13 +9,14 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
+    # auctions are closed and rents settled by tasks scheduled at their expiration, these are safety nets
     "close-auctions": {
         "task": "close_expired_auctions",
-        "schedule": 1.0,
+        "schedule": 60.0,
     },
     "settle-rents": {
         "task": "settle_rents",
-        "schedule": 10.0,
+        "schedule": 60.0 * 5,
     },
     "generate-auction": {
         "task": "generate_auction",
@@ -29,7 +30,7 @@ app.conf.beat_schedule = {
     },
     "update-video-views": {
         "task": "update_video_views",
-        "schedule": 3600,
+        "schedule": 60.0,
         # 'args': (16, 16)
     },
 }
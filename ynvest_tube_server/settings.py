@@ -14,9 +14,6 @@ from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 from celery.schedules import crontab
-from googleapiclient.discovery import build
-
-from ynvest_tube_server.api_config import api_key
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ynvest_tube_server.ynvest_tube_app.middleware.request_metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,10 +51,14 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "ynvest_tube_server.ynvest_tube_app.middleware.asgi_urlconf_middleware",
 ]
 
 ROOT_URLCONF = "ynvest_tube_server.urls"
 
+# routes requests served through ASGI to async views
+ASGI_URLCONF = "ynvest_tube_server.urls_async"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -128,6 +130,21 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# cache, shared by web and celery processes (locks, cached responses)
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+    }
+}
+# seconds after which cached auction pages expire even if not invalidated
+AUCTIONS_CACHE_TIMEOUT = 60 * 5
+
+# auction events pub/sub, RedisBroker is shared by web and celery processes, InMemoryBroker works within process
+EVENTS_BROKER = "ynvest_tube_server.ynvest_tube_app.events.RedisBroker"
+EVENTS_REDIS_URL = "redis://localhost:6379"
+EVENTS_CHANNEL = "auction-events"
+
 # swagger
 SWAGGER_YAML_FILENAME = "/docs/index.yml"
 
@@ -136,5 +153,47 @@ CELERY_BROKER_URL = "redis://localhost:6379"
 # CELERY_TIMEZONE = "Europe/Warsaw"
 CELERY_TASK_TRACK_STARTED = True
 
+# market tuning defaults, may be overridden at runtime with `./manage.py tune_market`, ranges are inclusive
+MARKET = {
+    "max_active_auctions": 10,
+    "auction_duration_minutes": (5, 30),
+    # uniform or staggered
+    "auction_duration_distribution": "uniform",
+    "starting_price": (200, 500),
+    "rental_duration_hours": (1, 24 * 7),
+}
+
+# redis broker redelivers messages not acknowledged within visibility timeout, eta tasks (auctions closing, rents
+# settlement) wait unacknowledged until due, so timeout must exceed default longest rental, tasks due later
+# (market tuned at runtime) are not scheduled and left to periodic closer and settler
+CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 3600 * (MARKET["rental_duration_hours"][1] + 1)}
+
+# seconds celery worker metrics snapshot is kept after last task run of the worker
+METRICS_SNAPSHOT_TIMEOUT = 3600 * 24
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"simple": {"format": "[%(asctime)s: %(levelname)s/%(name)s] %(message)s"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "simple"}},
+    "loggers": {"ynvest_tube_server": {"handlers": ["console"], "level": "INFO", "propagate": False}},
+}
+
+# seconds of loyalty payout period, users are paid at most once per period
+LOYALTY_PAYOUT_PERIOD = 3600 * 24 * 7
+
 # youtube
-youtube = build("youtube", "v3", developerKey=api_key)
+YOUTUBE_CLIENT_FACTORY = "ynvest_tube_server.ynvest_tube_app.youtube_service.build_youtube_client"
+YOUTUBE_STATISTICS_WORKERS = 4
+YOUTUBE_REQUESTS_PER_SECOND = 10
+YOUTUBE_REQUEST_RETRIES = 3
+# words searched on youtube by videos insertion, downloaded once and cached
+WORD_LIST_URL = "https://www.mit.edu/~ecprice/wordlist.10000"
+# seconds between statistics refreshes of video in each state
+VIDEO_STATISTICS_REFRESH_INTERVALS = {
+    "rented": 60 * 15,
+    "auctioned": 60 * 30,
+    "available": 3600 * 24,
+}
+# rented videos are refreshed this many seconds before rental expiration, ahead of settlement
+VIDEO_STATISTICS_SETTLEMENT_LEAD = 60 * 5
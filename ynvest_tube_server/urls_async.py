@@ -0,0 +1,16 @@
+"""
+ynvest_tube_server URL Configuration of requests served through ASGI, see `ynvest_tube_app.middleware`.
+
+"""
+from django.conf.urls.static import static
+from django.contrib import admin
+from django.urls import path, include
+from swagger_render.views import SwaggerUIView
+
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path("", include("ynvest_tube_server.ynvest_tube_app.urls_async")),
+    path("", SwaggerUIView.as_view()),
+]
+
+urlpatterns += static("/docs/", document_root="docs")
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class YnvestTubeServerAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ynvest_tube_server.ynvest_tube_app"
+
+    def ready(self) -> None:
+        # installs sql queries timer on every database connection
+        from ynvest_tube_server.ynvest_tube_app import metrics  # noqa: F401
@@ -0,0 +1,93 @@
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ynvest_tube_server.ynvest_tube_app.models import Auction, AuctionState
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import PageParams
+
+VERSION_KEY = "auctions-cache:version"
+HITS_KEY = "auctions-cache:hits"
+MISSES_KEY = "auctions-cache:misses"
+
+# serialized auction with id of its last bidder
+CachedAuction = Tuple[Dict, Optional[UUID]]
+
+
+def _version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from unique value, so entries cached before version key eviction are never matched again
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _count(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def invalidate_auctions() -> None:
+    """
+    Invalidates all cached auction pages.
+
+    Cached pages are keyed by version, so incrementing version drops all of them at once,
+    stale entries simply expire.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_auctions_on_commit() -> None:
+    """
+    Invalidates cached auction pages after current transaction commit (immediately outside of transaction).
+
+    Invalidation before commit would let concurrent request cache page read from not yet changed rows.
+    """
+    transaction.on_commit(invalidate_auctions)
+
+
+def get_auctions_page(state: AuctionState, params: PageParams) -> List[CachedAuction]:
+    """
+    Returns page of serialized auctions in given state, read through cache.
+
+    Pages are shared by all users, user specific data should be overlaid on returned rows.
+
+    :param state: state of listed auctions
+    :param params: pagination parameters
+    :return: list of serialized auctions with ids of their last bidders
+    """
+    fields = ",".join(name for name, *_ in params.serializer.accessors)
+    key = f"auctions-cache:{_version()}:{int(state)}:{params.after}:{params.limit}:{fields}"
+    page = cache.get(key)
+    if page is not None:
+        _count(HITS_KEY)
+        return page
+
+    _count(MISSES_KEY)
+    query_set = Auction.objects.filter(state=state).order_by("pk")
+    if params.after is not None:
+        query_set = query_set.filter(pk__gt=params.after)
+    page = list(params.serializer.iter_serialized(query_set[: params.limit], extra=("last_bidder_id",)))
+    page = [(row, last_bidder_id) for row, (last_bidder_id,) in page]
+    cache.set(key, page, timeout=settings.AUCTIONS_CACHE_TIMEOUT)
+    return page
+
+
+def get_cache_statistics() -> Dict[str, int]:
+    """
+    Returns auctions cache hits and misses counters.
+
+    """
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+    return {"hits": hits, "misses": misses, "version": cache.get(VERSION_KEY)}
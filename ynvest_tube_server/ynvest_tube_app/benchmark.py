@@ -0,0 +1,313 @@
+"""
+Benchmark suite: seeding of disposable database, HTTP load generator and beat tasks timing.
+
+Used by `seed_benchmark`, `benchmark` and `loadtest` management commands.
+"""
+import http.client
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.utils import timezone
+
+from ynvest_tube_server.ynvest_tube_app.metrics import collect_timings
+from ynvest_tube_server.ynvest_tube_app.models import (
+    Auction,
+    AuctionState,
+    Bids,
+    CashLedger,
+    CashOperation,
+    Rent,
+    RentState,
+    User,
+    Video,
+    VideoState,
+)
+
+SEED_BATCH_SIZE = 5000
+SEED_LINK_PREFIX = "benchmark-"
+# seeded users can afford any bid placed during benchmark
+SEED_USER_CASH = 10 ** 9
+
+_server_timing_queries = re.compile(rb'desc="(\d+) queries"')
+
+
+class Request(NamedTuple):
+    # endpoint name results are grouped by
+    name: str
+    method: str
+    path: str
+    body: Optional[bytes] = None
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """
+    Returns value below which `fraction` of sorted latencies are.
+
+    """
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class LoadWorker(threading.Thread):
+    """
+    Sends requests one after another over single keep-alive connection until deadline.
+
+    Number of SQL queries of each request is read from Server-Timing header, when server sends it.
+    """
+
+    def __init__(self, base_url: str, next_request: Callable[[], Request], deadline: float) -> None:
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.next_request, self.deadline = next_request, deadline
+        # per endpoint name: latencies, queries of requests
+        self.latencies: Dict[str, List[float]] = {}
+        self.queries: Dict[str, List[int]] = {}
+        self.errors = 0
+
+    def run(self) -> None:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while time.perf_counter() < self.deadline:
+            request = self.next_request()
+            headers = {"Content-Type": "application/json"} if request.body else {}
+            start = time.perf_counter()
+            try:
+                connection.request(request.method, self.prefix + request.path, body=request.body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                continue
+            latency = time.perf_counter() - start
+            if response.status >= 500:
+                self.errors += 1
+                continue
+            self.latencies.setdefault(request.name, []).append(latency)
+            match = _server_timing_queries.search((response.getheader("Server-Timing") or "").encode())
+            if match:
+                self.queries.setdefault(request.name, []).append(int(match.group(1)))
+        connection.close()
+
+
+def _summary(latencies: List[float], queries: List[int], elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run_load(base_url: str, next_request: Callable[[], Request], concurrency: int, duration: float) -> Dict:
+    """
+    Drives server with `concurrency` keep-alive connections for `duration` seconds.
+
+    :param base_url: server url, e.g. http://127.0.0.1:8000
+    :param next_request: returns next request to send, called concurrently by workers
+    :return: overall and per endpoint throughput, p50/p99 latencies and queries per request, errors count
+    """
+    start = time.perf_counter()
+    workers = [LoadWorker(base_url, next_request, start + duration) for _ in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    names = sorted({name for w in workers for name in w.latencies})
+    latencies = {name: [latency for w in workers for latency in w.latencies.get(name, ())] for name in names}
+    queries = {name: [count for w in workers for count in w.queries.get(name, ())] for name in names}
+    result = _summary(sum(latencies.values(), []), sum(queries.values(), []), elapsed)
+    result["errors"] = sum(w.errors for w in workers)
+    result["endpoints"] = {name: _summary(latencies[name], queries[name], elapsed) for name in names}
+    return result
+
+
+class Workloads:
+    """
+    Request generators of benchmark workloads over seeded users and auctions.
+
+        - polling - clients refreshing auctions list, auction, user and user dashboard
+        - bidding - clients bidding on active auctions
+        - mixed - 80% polling, 20% bidding
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.random = random.Random(seed)
+        self.users = [str(u) for u in User.objects.order_by("pk").values_list("pk", flat=True)[:1000]]
+        self.auctions = list(
+            Auction.objects.filter(state=AuctionState.ACTIVE, auction_expiration_date__gt=timezone.now())
+            .order_by("pk")
+            .values_list("pk", flat=True)[:1000]
+        )
+        if not self.users or not self.auctions:
+            raise ValueError("Database has no users or active auctions, seed it with `seed_benchmark` first.")
+        # bids only grow, so most of them outbid previous ones
+        self._bid_values = itertools.count(SEED_USER_CASH // 1000)
+        self._lock = threading.Lock()
+
+    def _user_body(self, **extra) -> bytes:
+        return json.dumps({"UserId": self.random.choice(self.users), **extra}).encode()
+
+    def polling(self) -> Request:
+        with self._lock:
+            draw = self.random.random()
+            if draw < 0.7:
+                return Request("auctions", "GET", "/auctions?limit=20")
+            if draw < 0.8:
+                return Request("auction", "POST", f"/auctions/{self.random.choice(self.auctions)}", self._user_body())
+            if draw < 0.9:
+                return Request("user", "POST", "/user", self._user_body())
+            return Request("user-details", "POST", "/user/details?limit=20", self._user_body())
+
+    def bidding(self) -> Request:
+        with self._lock:
+            body = self._user_body(bidValue=next(self._bid_values))
+            return Request("bid", "PUT", f"/auctions/{self.random.choice(self.auctions)}", body)
+
+    def mixed(self) -> Request:
+        with self._lock:
+            bidding = self.random.random() < 0.2
+        return self.bidding() if bidding else self.polling()
+
+    def get(self, name: str) -> Callable[[], Request]:
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload `{name}`, available: {', '.join(WORKLOADS)}.")
+        return getattr(self, name)
+
+
+WORKLOADS = ("polling", "bidding", "mixed")
+
+
+def _seeded_video_state(index: int, auctions: int, rents: int) -> int:
+    if index < auctions:
+        return VideoState.AUCTIONED
+    return VideoState.RENTED if index < auctions + rents else VideoState.AVAILABLE
+
+
+def seed(users: int, videos: int, auctions: int, bids: int, rents: int, seed: Optional[int] = None) -> Dict[str, int]:
+    """
+    Seeds database with benchmark data in bulk.
+
+    Half of `videos` are put on auctions, one tenth of auctions has already expired (work for auctions closer).
+    Rents are assigned to closed auctions, one tenth of them is due (work for rents settler).
+    Users registered over last year, so each loyalty degree is populated.
+
+    :return: number of created rows of each model
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    auctions, rents = min(auctions, videos // 2), min(rents, videos - min(auctions, videos // 2))
+
+    with transaction.atomic():
+        user_rows = [User(cash=SEED_USER_CASH) for _ in range(users)]
+        User.objects.bulk_create(user_rows, batch_size=SEED_BATCH_SIZE)
+        for u in user_rows:
+            u.creation_date = now - timezone.timedelta(days=rng.uniform(0, 365))
+        User.objects.bulk_update(user_rows, ["creation_date"], batch_size=SEED_BATCH_SIZE)
+        CashLedger.objects.bulk_create(
+            (CashLedger(user=u, amount=u.cash, operation=CashOperation.OPENING_BALANCE) for u in user_rows),
+            batch_size=SEED_BATCH_SIZE,
+        )
+
+        first_link = Video.objects.filter(link__startswith=SEED_LINK_PREFIX).count()
+        Video.objects.bulk_create(
+            (
+                Video(
+                    title=f"Benchmark video {i}",
+                    description="Benchmark video description. " * 10,
+                    link=f"{SEED_LINK_PREFIX}{first_link + i}",
+                    views=rng.randint(1_000, 10_000_000),
+                    likes=rng.randint(0, 10_000),
+                    dislikes=rng.randint(0, 1_000),
+                    state=_seeded_video_state(i, auctions, rents),
+                    next_statistics_refresh=now + timezone.timedelta(seconds=rng.randint(-3600, 3600)),
+                )
+                for i in range(videos)
+            ),
+            batch_size=SEED_BATCH_SIZE,
+        )
+        video_rows = list(
+            Video.objects.filter(link__startswith=SEED_LINK_PREFIX).only("id", "views").order_by("-id")[:videos]
+        )[::-1]
+
+        def auction(v: Video, state: int, expiration: timezone.datetime) -> Auction:
+            rental_duration = timezone.timedelta(hours=rng.randint(1, 24 * 7))
+            return Auction(
+                state=state,
+                starting_price=rng.randint(200, 500),
+                video_id=v.id,
+                rental_duration=rental_duration,
+                auction_expiration_date=expiration,
+                rental_expiration_date=expiration + rental_duration,
+                video_views_on_sold=v.views,
+            )
+
+        active = [
+            auction(v, AuctionState.ACTIVE, now + timezone.timedelta(minutes=rng.uniform(-30, 300)))
+            for v in video_rows[:auctions]
+        ]
+        closed = [
+            auction(v, AuctionState.INACTIVE, now - timezone.timedelta(days=rng.uniform(0, 7)))
+            for v in video_rows[auctions : auctions + rents]
+        ]
+        for a in closed:
+            a.last_bidder_id, a.last_bid_value = rng.choice(user_rows).id, rng.randint(500, 5000)
+        Auction.objects.bulk_create(active + closed, batch_size=SEED_BATCH_SIZE)
+        auction_ids = dict(
+            Auction.objects.filter(video_id__in=[v.id for v in video_rows]).values_list("video_id", "id")
+        )
+
+        Rent.objects.bulk_create(
+            (
+                Rent(auction_id=auction_ids[a.video_id], user_id=a.last_bidder_id, state=RentState.ACTIVE)
+                for a in closed
+            ),
+            batch_size=SEED_BATCH_SIZE,
+        )
+        active_ids = [auction_ids[a.video_id] for a in active]
+        Bids.objects.bulk_create(
+            (
+                Bids(auction_id=rng.choice(active_ids), user_id=rng.choice(user_rows).id, value=rng.randint(500, 5000))
+                for _ in range(bids if active_ids else 0)
+            ),
+            batch_size=SEED_BATCH_SIZE,
+        )
+
+    return {
+        "users": users,
+        "videos": videos,
+        "auctions": len(active) + len(closed),
+        "bids": bids if active_ids else 0,
+        "rents": len(closed),
+    }
+
+
+def time_task(task: Callable, *args, **kwargs) -> Dict:
+    """
+    Runs task synchronously in this process and measures it.
+
+    :return: wall time, SQL queries count, database time and task result
+    """
+    with collect_timings() as timings:
+        start = time.perf_counter()
+        result = task(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 4),
+        "queries": timings.queries,
+        "db_seconds": round(timings.db, 4),
+        "result": result if isinstance(result, (int, dict)) else None,
+    }
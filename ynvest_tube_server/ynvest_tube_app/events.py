@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from ynvest_tube_server.ynvest_tube_app.serializers import dumps
+
+logger = logging.getLogger(__name__)
+
+# messages queued for slow subscriber, oldest ones are dropped above that
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    Stream of encoded events delivered to one subscriber, consumed on subscriber event loop.
+
+    """
+
+    def __init__(self, broker: "InMemoryBroker", loop: asyncio.AbstractEventLoop) -> None:
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def put(self, message: bytes) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self) -> bytes:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """
+    Pub/sub within single process, events published from any thread are delivered to subscribers event loops.
+
+    Suitable for tests and single process deployments, events published by celery workers are not delivered.
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, message: bytes) -> None:
+        self.dispatch(message)
+
+    def dispatch(self, message: bytes) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for s in subscriptions:
+            s.loop.call_soon_threadsafe(s.put, message)
+
+    def subscribe(self) -> Subscription:
+        """
+        Subscribes to events, must be called from running event loop.
+
+        """
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Pub/sub over redis channel, shared by web and celery processes.
+
+    Each process subscribed to events listens to redis channel in background thread
+    and delivers events to its subscribers.
+    """
+
+    def __init__(self, url: Optional[str] = None, channel: Optional[str] = None) -> None:
+        super().__init__()
+        self.redis = redis.Redis.from_url(url or settings.EVENTS_REDIS_URL)
+        self.channel = channel or settings.EVENTS_CHANNEL
+        self._listener: Optional[threading.Thread] = None
+
+    def publish(self, message: bytes) -> None:
+        self.redis.publish(self.channel, message)
+
+    def subscribe(self) -> Subscription:
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+                self._listener.start()
+        return super().subscribe()
+
+    def _listen(self) -> None:
+        # listener never exits, any failure resubscribes after a while, so subscribers are not left without events
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.dispatch(message["data"])
+            except redis.ConnectionError as error:
+                logger.warning("Events channel `%s` disconnected: %s", self.channel, error)
+            except Exception:
+                logger.exception("Events listener of channel `%s` failed", self.channel)
+            finally:
+                pubsub.close()
+            time.sleep(1)
+
+
+_broker = None
+
+
+def get_broker() -> InMemoryBroker:
+    """
+    Returns process wide events broker configured by EVENTS_BROKER setting.
+
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+def publish_event(event: Dict) -> None:
+    """
+    Publishes event after current transaction commit (immediately outside of transaction).
+
+    Events are only notifications, failure of broker never fails the change that caused event.
+
+    :param event: json serializable dict with `type` key
+    """
+    message = dumps(event)
+
+    def publish() -> None:
+        try:
+            get_broker().publish(message)
+        except redis.RedisError as error:
+            logger.warning("Event `%s` not published: %s", event["type"], error)
+
+    transaction.on_commit(publish)
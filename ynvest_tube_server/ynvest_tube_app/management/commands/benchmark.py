@@ -0,0 +1,157 @@
+import json
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ynvest_tube_server.ynvest_tube_app import tasks
+from ynvest_tube_server.ynvest_tube_app.benchmark import WORKLOADS, Workloads, run_load, time_task
+from ynvest_tube_server.ynvest_tube_app.models import Auction, Bids, Rent, User, Video
+from ynvest_tube_server.ynvest_tube_app.views_helpers.video import WORD_LIST_CACHE_KEY
+
+FAKE_YOUTUBE_CLIENT_FACTORY = "ynvest_tube_server.ynvest_tube_app.youtube_fake.build_fake_youtube_client"
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@contextmanager
+def local_server() -> Iterator[str]:
+    """
+    Serves application with threaded WSGI server (runserver one) on free local port.
+
+    :return: server url
+    """
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def beat_tasks_timings() -> Dict[str, Dict]:
+    """
+    Runs each beat task once against current data, with fake youtube client and without enqueuing followups.
+
+    """
+    cache.add(WORD_LIST_CACHE_KEY, [f"benchmark{i}" for i in range(1000)], timeout=None)
+    with override_settings(YOUTUBE_CLIENT_FACTORY=FAKE_YOUTUBE_CLIENT_FACTORY), mock.patch.object(
+        tasks, "schedule_auctions_closing"
+    ), mock.patch.object(tasks, "schedule_rents_settlement"):
+        return {
+            "update_video_views": time_task(tasks.update_videos_views),
+            "insert_youtube_videos": time_task(tasks.insert_youtube_videos),
+            "close_expired_auctions": time_task(tasks.close_expired_auctions),
+            "generate_auction": time_task(tasks.generate_auction),
+            "settle_rents": time_task(tasks.settle_users_rents),
+            "payout_loyalty_cash": time_task(tasks.payout_loyalty_cash),
+        }
+
+
+def _change(previous: Optional[float], current: Optional[float]) -> str:
+    if not previous or current is None:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks seeded database (see `seed_benchmark`): drives endpoints with polling, bidding and mixed "
+        "workloads and times each beat task, results are written as json. Benchmark changes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=None, help="Benchmarked server url, by default local server is started.")
+        parser.add_argument("--workloads", default=",".join(WORKLOADS), help="Comma separated workloads to run.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Number of parallel connections.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds of each workload.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of workloads.")
+        parser.add_argument("--no-tasks", action="store_true", help="Skip beat tasks timing.")
+        parser.add_argument("--output", default=None, help="Json results file, printed if missing.")
+        parser.add_argument("--compare", default=None, help="Json results of previous run to compare with.")
+
+    def handle(self, *args, **options):
+        try:
+            workloads = Workloads(options["seed"])
+            generators = {name: workloads.get(name) for name in options["workloads"].split(",") if name}
+        except ValueError as error:
+            raise CommandError(error)
+
+        results = {
+            "commit": current_commit(),
+            "date": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "data": {model.__name__.lower(): model.objects.count() for model in (User, Video, Auction, Bids, Rent)},
+            "concurrency": options["concurrency"],
+            "duration": options["duration"],
+            "workloads": {},
+            "tasks": {},
+        }
+        if options["url"]:
+            results["workloads"] = self.run_workloads(options["url"], generators, options)
+        else:
+            with local_server() as url:
+                results["workloads"] = self.run_workloads(url, generators, options)
+        if not options["no_tasks"]:
+            results["tasks"] = beat_tasks_timings()
+
+        encoded = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(encoded)
+        else:
+            self.stdout.write(encoded)
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                self.compare(json.load(file), results)
+
+    def run_workloads(self, url: str, generators: Dict, options: Dict) -> Dict[str, Dict]:
+        results = {}
+        for name, generator in generators.items():
+            results[name] = run_load(url, generator, options["concurrency"], options["duration"])
+            self.stderr.write(
+                f"{name:<10} {results[name]['rps']:10.1f} req/s  p99 {results[name]['p99_ms']:8.1f} ms  "
+                f"{results[name]['errors']} errors"
+            )
+        return results
+
+    def compare(self, previous: Dict, current: Dict) -> None:
+        self.stdout.write(f"\nChange since {previous.get('commit')} ({previous.get('date')}):")
+        for name, result in current["workloads"].items():
+            before = previous.get("workloads", {}).get(name, {})
+            self.stdout.write(
+                f"{name:<24} rps {_change(before.get('rps'), result['rps']):>8}  "
+                f"p99 {_change(before.get('p99_ms'), result['p99_ms']):>8}  "
+                f"queries/request {_change(before.get('queries_per_request'), result['queries_per_request']):>8}"
+            )
+        for name, result in current["tasks"].items():
+            before = previous.get("tasks", {}).get(name, {})
+            self.stdout.write(
+                f"{name:<24} time {_change(before.get('seconds'), result['seconds']):>8}  "
+                f"queries {_change(before.get('queries'), result['queries']):>8}"
+            )
@@ -0,0 +1,86 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from ynvest_tube_server.ynvest_tube_app.models import Auction, Video
+from ynvest_tube_server.ynvest_tube_app.serializers import AUCTION_SERIALIZER
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import FastJsonResponse
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def legacy_path() -> bytes:
+    data = [a.serialize() for a in Auction.objects.all()]
+    return JsonResponse(data, safe=False).content
+
+
+def compiled_path() -> bytes:
+    data = AUCTION_SERIALIZER.serialize_query_set(Auction.objects.all())
+    return FastJsonResponse(data, safe=False).content
+
+
+class Command(BaseCommand):
+    help = "Compares Serializable.serialize with compiled serializers on seeded auctions, data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--auctions", type=int, default=10000, help="Number of seeded auctions.")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs of each path, best one is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options["auctions"])
+                for name, path in (("legacy", legacy_path), ("compiled", compiled_path)):
+                    self.measure(name, path, options["repeat"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def seed(self, count: int) -> None:
+        now = timezone.now()
+        # links are unique, prefix of this run never matches videos already in database
+        prefix = f"benchmark-serializers-{uuid.uuid4().hex}-"
+        videos = Video.objects.bulk_create(
+            Video(title=f"video {i}", description="description " * 50, link=f"{prefix}{i}", views=i)
+            for i in range(count)
+        )
+        if not videos[0].id:  # backends without returning ids from bulk insert
+            videos = list(Video.objects.filter(link__startswith=prefix).order_by("id"))
+        Auction.objects.bulk_create(
+            Auction(
+                starting_price=200,
+                video=v,
+                rental_duration=timezone.timedelta(days=1),
+                auction_expiration_date=now + timezone.timedelta(minutes=10),
+                rental_expiration_date=now + timezone.timedelta(days=1),
+                video_views_on_sold=v.views,
+            )
+            for v in videos
+        )
+
+    def measure(self, name: str, path, repeat: int) -> None:
+        best, queries, size = None, 0, 0
+        for _ in range(repeat):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                content = path()
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            queries, size = counter.count, len(content)
+        self.stdout.write(f"{name:<10} {best * 1000:10.1f} ms  {queries:6} queries  {size / 1024:10.1f} KiB")
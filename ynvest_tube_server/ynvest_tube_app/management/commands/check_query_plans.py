@@ -0,0 +1,81 @@
+import re
+import uuid
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from ynvest_tube_server.ynvest_tube_app.models import (
+    Auction,
+    AuctionState,
+    Bids,
+    Rent,
+    RentState,
+    Video,
+    VideoState,
+)
+
+# plan lines meaning that whole table is read, per database vendor
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(\w+)\b(?! USING)"),
+    "postgresql": re.compile(r"\bSeq Scan on (\w+)"),
+}
+
+
+def hot_queries() -> Dict[str, QuerySet]:
+    """
+    Queries run by periodic tasks and most polled endpoints.
+
+    """
+    now, user_id = timezone.now(), uuid.uuid4()
+    return {
+        "close expired auctions": Auction.objects.filter(state=AuctionState.ACTIVE, auction_expiration_date__lte=now),
+        "settle due rents": Rent.objects.filter(auction__rental_expiration_date__lte=now, state=RentState.ACTIVE),
+        "available videos": Video.objects.filter(state=VideoState.AVAILABLE),
+        "videos due to statistics refresh": Video.objects.filter(
+            Q(next_statistics_refresh__isnull=True) | Q(next_statistics_refresh__lte=now)
+        ),
+        "user bids in auction": Bids.objects.filter(auction_id=1, user_id=user_id),
+        "user bids in auctions": Bids.objects.filter(user_id=user_id, auction_id__in=[1, 2, 3]),
+        "user leading auctions": Auction.objects.filter(last_bidder_id=user_id, state=AuctionState.ACTIVE),
+        "user rents": Rent.objects.filter(user_id=user_id, state=RentState.ACTIVE),
+    }
+
+
+def find_full_scans(plan: str, vendor: str) -> List[str]:
+    """
+    Finds plan lines describing full table scan.
+
+    :param plan: output of QuerySet.explain()
+    :param vendor: database vendor
+    :return: lines of plan that scan whole table
+    """
+    pattern = FULL_SCAN_PATTERNS.get(vendor)
+    if pattern is None:
+        raise CommandError(f"Query plan check is not supported for `{vendor}` database.")
+    return [line.strip() for line in plan.splitlines() if pattern.search(line)]
+
+
+class Command(BaseCommand):
+    help = "Explains hot queries (EXPLAIN QUERY PLAN on sqlite) and fails if any of them scans whole table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print full plan of every query.")
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, query_set in hot_queries().items():
+            plan = query_set.explain()
+            full_scans = find_full_scans(plan, connection.vendor)
+            if options["verbose_plans"]:
+                self.stdout.write(f"{name}:\n{plan}")
+            if full_scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}: {'; '.join(full_scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK         {name}"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries do full table scan: {', '.join(failures)}.")
@@ -0,0 +1,34 @@
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ynvest_tube_server.ynvest_tube_app.benchmark import Request, run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests running server with concurrent keep-alive connections and reports throughput and latencies, "
+        "e.g. to compare WSGI and ASGI deployments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Full url of tested endpoint, e.g. http://localhost:8000/auctions.")
+        parser.add_argument("--method", default="GET", help="Request method.")
+        parser.add_argument("--body", default=None, help="Json body sent with each request.")
+        parser.add_argument("--concurrency", type=int, default=10, help="Number of parallel connections.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Test duration in seconds.")
+
+    def handle(self, *args, **options):
+        parts = urlsplit(options["url"])
+        if parts.scheme != "http":
+            raise CommandError("Only http urls are supported.")
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        body = options["body"].encode() if options["body"] else None
+        request = Request("endpoint", options["method"], path, body)
+        result = run_load(f"http://{parts.netloc}", lambda: request, options["concurrency"], options["duration"])
+        self.stdout.write(
+            f"{result['requests']} requests in {options['duration']:.1f} s, {result['errors']} errors\n"
+            f"{result['rps']:10.1f} requests/s\n"
+            f"{result['p50_ms']:10.1f} ms p50\n"
+            f"{result['p99_ms']:10.1f} ms p99"
+        )
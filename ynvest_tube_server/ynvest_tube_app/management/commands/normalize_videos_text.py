@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ynvest_tube_server.ynvest_tube_app.models import Video
+from ynvest_tube_server.ynvest_tube_app.views_helpers.video import fix_punctuation_marks
+
+
+class Command(BaseCommand):
+    help = "Unescapes html entities left in titles and descriptions of existing videos, chunk by chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Videos processed at once.")
+
+    def handle(self, *args, **options):
+        videos = Video.objects.only("id", "title", "description").order_by("pk")
+        last_id, checked, fixed = None, 0, 0
+        while True:
+            chunk = list((videos.filter(pk__gt=last_id) if last_id else videos)[: options["chunk_size"]])
+            if not chunk:
+                break
+            changed = []
+            for v in chunk:
+                title, description = fix_punctuation_marks(v.title), fix_punctuation_marks(v.description)
+                if (title, description) != (v.title, v.description):
+                    v.title, v.description = title, description
+                    changed.append(v)
+            Video.objects.bulk_update(changed, ["title", "description"])
+            checked += len(chunk)
+            fixed += len(changed)
+            last_id = chunk[-1].pk
+
+        self.stdout.write(f"Checked {checked} videos, {fixed} normalized.")
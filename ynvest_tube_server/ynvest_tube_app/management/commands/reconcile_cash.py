@@ -0,0 +1,69 @@
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from ynvest_tube_server.ynvest_tube_app.models import CashLedger, User
+
+
+def ledger_balances(user_ids: List[UUID]) -> Dict[UUID, int]:
+    """
+    Sums ledger entries of users with one aggregate query.
+
+    :param user_ids: ids of users
+    :return: dict with user id as key and ledger balance as value, users without entries are absent
+    """
+    return dict(
+        CashLedger.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(balance=Sum("amount"))
+        .values_list("user_id", "balance")
+    )
+
+
+def find_mismatches(users: List[Tuple[UUID, int]]) -> List[Tuple[UUID, int, int]]:
+    """
+    Compares users cash with their ledger balances.
+
+    :param users: pairs of user id and cash
+    :return: triples of user id, cash and ledger balance of users whose cash differs from ledger
+    """
+    balances = ledger_balances([user_id for user_id, _ in users])
+    return [(user_id, cash, balances.get(user_id, 0)) for user_id, cash in users if cash != balances.get(user_id, 0)]
+
+
+class Command(BaseCommand):
+    help = "Recomputes users balances from cash ledger, one aggregate query per chunk of users, and reports mismatches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Users checked at once.")
+        parser.add_argument("--fix", action="store_true", help="Overwrite users cash with ledger balances.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk").values_list("pk", "cash")
+        last_id, checked, mismatched = None, 0, 0
+        while True:
+            with transaction.atomic():
+                chunk_query = users.filter(pk__gt=last_id) if last_id else users
+                if options["fix"]:
+                    # balances must not move between comparison and fix
+                    chunk_query = chunk_query.select_for_update()
+                chunk = list(chunk_query[: options["chunk_size"]])
+                if not chunk:
+                    break
+                mismatches = find_mismatches(chunk)
+                for user_id, cash, balance in mismatches:
+                    self.stdout.write(self.style.WARNING(f"MISMATCH {user_id}: cash {cash}, ledger {balance}"))
+                if options["fix"] and mismatches:
+                    User.objects.bulk_update(
+                        [User(id=user_id, cash=balance) for user_id, _, balance in mismatches], ["cash"]
+                    )
+            checked += len(chunk)
+            mismatched += len(mismatches)
+            last_id = chunk[-1][0]
+
+        self.stdout.write(f"Checked {checked} users, {mismatched} mismatched.")
+        if mismatched and not options["fix"]:
+            raise CommandError(f"{mismatched} users cash differs from cash ledger.")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ynvest_tube_server.ynvest_tube_app.benchmark import seed
+from ynvest_tube_server.ynvest_tube_app.models import User
+
+
+class Command(BaseCommand):
+    help = "Seeds disposable database (sqlite or postgres) with benchmark users, videos, auctions, bids and rents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--videos", type=int, default=20000)
+        parser.add_argument("--auctions", type=int, default=1000, help="Active auctions, at most half of videos.")
+        parser.add_argument("--bids", type=int, default=50000)
+        parser.add_argument("--rents", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, same seed gives same data.")
+        parser.add_argument("--force", action="store_true", help="Seed even if database already has users.")
+
+    def handle(self, *args, **options):
+        if User.objects.exists() and not options["force"]:
+            raise CommandError("Database is not empty, benchmark changes data, use --force to seed it anyway.")
+        created = seed(
+            options["users"], options["videos"], options["auctions"], options["bids"], options["rents"], options["seed"]
+        )
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in created.items()) + " created.")
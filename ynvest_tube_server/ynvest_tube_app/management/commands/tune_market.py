@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ynvest_tube_server.ynvest_tube_app.market import get_market_config, reset_market, tune_market
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows or tunes market settings at runtime, e.g. `tune_market max_active_auctions=20 starting_price=100,300`. "
+        "Changes apply to auctions generated since then, without restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("overrides", nargs="*", metavar="name=value", help="Market settings to override.")
+        parser.add_argument("--reset", action="store_true", help="Drop all runtime overrides.")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            config = reset_market()
+        elif options["overrides"]:
+            try:
+                overrides = dict(override.split("=", 1) for override in options["overrides"])
+                config = tune_market(**overrides)
+            except ValueError as error:
+                raise CommandError(f"Wrong market setting: {error}")
+        else:
+            config = get_market_config()
+
+        for name, value in config._asdict().items():
+            self.stdout.write(f"{name:<32} {value}")
@@ -0,0 +1,108 @@
+import random
+from typing import List, NamedTuple, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+OVERRIDES_KEY = "market:overrides"
+
+# auction durations are drawn independently (uniform) or spread evenly over range within each generated batch
+DISTRIBUTIONS = ("uniform", "staggered")
+
+
+class MarketConfig(NamedTuple):
+    """
+    Market tuning, ranges are inclusive.
+
+    """
+
+    max_active_auctions: int
+    auction_duration_minutes: Tuple[int, int]
+    auction_duration_distribution: str
+    starting_price: Tuple[int, int]
+    rental_duration_hours: Tuple[int, int]
+
+    def auction_durations(self, count: int) -> List[timezone.timedelta]:
+        """
+        Draws durations of `count` auctions generated together.
+
+        """
+        low, high = self.auction_duration_minutes
+        if self.auction_duration_distribution == "staggered" and count > 1:
+            minutes = [low + (high - low) * i / (count - 1) for i in range(count)]
+            random.shuffle(minutes)
+        else:
+            minutes = [random.uniform(low, high) for _ in range(count)]
+        return [timezone.timedelta(minutes=m) for m in minutes]
+
+    def draw_starting_price(self) -> int:
+        return random.randint(*self.starting_price)
+
+    def draw_rental_duration(self) -> timezone.timedelta:
+        return timezone.timedelta(hours=random.randint(*self.rental_duration_hours))
+
+
+def _parse(name: str, value) -> object:
+    """
+    Converts and validates market setting value.
+
+    :raises ValueError: if name is not market setting or value is wrong
+    """
+    if name not in MarketConfig._fields:
+        raise ValueError(f"Unknown market setting `{name}`, available: {', '.join(MarketConfig._fields)}.")
+    if name == "auction_duration_distribution":
+        if value not in DISTRIBUTIONS:
+            raise ValueError(f"`{name}` must be one of: {', '.join(DISTRIBUTIONS)}.")
+        return value
+    if name == "max_active_auctions":
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"`{name}` must not be negative.")
+        return value
+
+    if isinstance(value, str):
+        value = value.split(",")
+    try:
+        low, high = (int(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError(f"`{name}` must be range `low,high`.")
+    if not 0 <= low <= high:
+        raise ValueError(f"`{name}` must be range `low,high` with 0 <= low <= high.")
+    if name in ("auction_duration_minutes", "rental_duration_hours") and not low:
+        raise ValueError(f"`{name}` must be positive.")
+    return low, high
+
+
+def get_market_config() -> MarketConfig:
+    """
+    Returns market config, MARKET setting overridden by values tuned at runtime.
+
+    Overrides are kept in cache shared by all processes, so config should be read when it is used,
+    not once per process.
+    """
+    values = {name: _parse(name, value) for name, value in settings.MARKET.items()}
+    values.update(cache.get(OVERRIDES_KEY) or {})
+    return MarketConfig(**values)
+
+
+def tune_market(**overrides) -> MarketConfig:
+    """
+    Overrides market settings at runtime, applied to every auction generated since then.
+
+    :raises ValueError: if any of overrides is wrong, nothing is changed then
+    :return: new market config
+    """
+    parsed = {name: _parse(name, value) for name, value in overrides.items()}
+    current = cache.get(OVERRIDES_KEY) or {}
+    cache.set(OVERRIDES_KEY, {**current, **parsed}, timeout=None)
+    return get_market_config()
+
+
+def reset_market() -> MarketConfig:
+    """
+    Drops runtime overrides, MARKET setting applies again.
+
+    """
+    cache.delete(OVERRIDES_KEY)
+    return get_market_config()
@@ -0,0 +1,376 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# snapshots of metrics of celery worker processes, merged into metrics rendered by web processes,
+# each process saves its snapshot in own numbered slot, slots count is claimed with atomic increment
+SNAPSHOT_KEY_PREFIX = "metrics:snapshot:"
+SNAPSHOT_SLOTS_KEY = "metrics:snapshot-slots"
+
+# seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0)
+LAG_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """
+    Prometheus counter with labels.
+
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    def samples(self, snapshots: Sequence[List] = ()) -> Iterator[Tuple[str, LabelValues, Sequence[str], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for snapshot in snapshots:
+            for label_values, value in snapshot:
+                values[tuple(label_values)] = values.get(tuple(label_values), 0) + value
+        for label_values, value in values.items():
+            yield self.name, label_values, (), value
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels, observation takes one bisect of upper bounds.
+
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=DURATION_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # per label values: count in each bucket (last one is +Inf), sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def snapshot(self) -> List:
+        with self._lock:
+            return [
+                [list(label_values), list(counts), total[0]] for label_values, (counts, total) in self._values.items()
+            ]
+
+    def samples(self, snapshots: Sequence[List] = ()) -> Iterator[Tuple[str, LabelValues, Sequence[str], float]]:
+        values = {}
+        for snapshot in (self.snapshot(), *snapshots):
+            for label_values, counts, total in snapshot:
+                merged_counts, merged_total = values.get(tuple(label_values), ([0] * len(counts), 0.0))
+                values[tuple(label_values)] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for label_values, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", label_values, (("le", bound),), cumulative
+            yield f"{self.name}_sum", label_values, (), total
+            yield f"{self.name}_count", label_values, (), cumulative
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    """
+    Collection of metrics rendered in prometheus text exposition format.
+
+    """
+
+    def __init__(self) -> None:
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, List]:
+        """
+        Returns picklable values of all metrics, to be merged into metrics rendered by other process.
+
+        """
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def render(self, counters: Optional[Dict[str, float]] = None, snapshots: Sequence[Dict[str, List]] = ()) -> str:
+        """
+        Renders all metrics.
+
+        :param counters: additional counters without labels, e.g. kept outside of process
+        :param snapshots: snapshots of registries of other processes, added to values of this one
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            metric_snapshots = [snapshot[metric.name] for snapshot in snapshots if metric.name in snapshot]
+            for name, label_values, extra_labels, value in metric.samples(metric_snapshots):
+                labels = [*zip(metric.labels, label_values), *extra_labels]
+                rendered = ",".join(f'{label}="{_escape(v)}"' for label, v in labels)
+                series = f"{name}{{{rendered}}}" if labels else name
+                lines.append(f"{series} {_format_value(value)}")
+        for name, value in (counters or {}).items():
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(
+    Counter("ynvest_http_requests_total", "HTTP requests by view, method and status.", ("view", "method", "status"))
+)
+REQUEST_DURATION = REGISTRY.register(
+    Histogram("ynvest_http_request_duration_seconds", "Time of handling request.", ("view", "method"))
+)
+REQUEST_DB_DURATION = REGISTRY.register(
+    Histogram("ynvest_http_request_db_duration_seconds", "Time of SQL queries of request.", ("view", "method"))
+)
+REQUEST_SERIALIZATION_DURATION = REGISTRY.register(
+    Histogram(
+        "ynvest_http_request_serialization_duration_seconds",
+        "Time of building and encoding response data of request.",
+        ("view", "method"),
+    )
+)
+REQUEST_QUERIES = REGISTRY.register(
+    Histogram("ynvest_http_request_queries", "SQL queries of request.", ("view", "method"), QUERIES_BUCKETS)
+)
+RESPONSE_SIZE = REGISTRY.register(
+    Histogram("ynvest_http_response_size_bytes", "Size of response body.", ("view", "method"), SIZE_BUCKETS)
+)
+TASK_RUNS = REGISTRY.register(
+    Counter("ynvest_task_runs_total", "Celery task runs by task and final state.", ("task", "state"))
+)
+TASK_DURATION = REGISTRY.register(
+    Histogram("ynvest_task_duration_seconds", "Time of celery task run.", ("task",), TASK_DURATION_BUCKETS)
+)
+TASK_DB_DURATION = REGISTRY.register(
+    Histogram(
+        "ynvest_task_db_duration_seconds", "Time of SQL queries of celery task run.", ("task",), TASK_DURATION_BUCKETS
+    )
+)
+TASK_ITEMS = REGISTRY.register(
+    Counter("ynvest_task_items_total", "Items (auctions, rents, videos, users) processed by celery task.", ("task",))
+)
+AUCTION_CLOSE_LAG = REGISTRY.register(
+    Histogram(
+        "ynvest_auction_close_lag_seconds", "Delay of auction closing after its expiration date.", (), LAG_BUCKETS
+    )
+)
+RENT_SETTLEMENT_LAG = REGISTRY.register(
+    Histogram(
+        "ynvest_rent_settlement_lag_seconds",
+        "Delay of rent settlement after its rental expiration date.",
+        (),
+        LAG_BUCKETS,
+    )
+)
+
+
+class Timings:
+    """
+    Work measured within one request (or task).
+
+    """
+
+    __slots__ = ("queries", "db", "serialization")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db = 0.0
+        self.serialization = 0.0
+
+
+# timings of request being handled, copied to threads running its database work
+_current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Timings]:
+    """
+    Collects queries count, database and serialization time of code run within the block.
+
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def measure_serialization() -> Iterator[None]:
+    """
+    Adds time spent within the block to serialization time of current request, no-op outside of request.
+
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialization += time.perf_counter() - start
+
+
+def _measure_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+@receiver(connection_created)
+def _install_query_timer(sender, connection, **kwargs) -> None:
+    # connections are created per thread, so the timer is installed on every one of them
+    if _measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_measure_query)
+
+
+def observe_lags(histogram: Histogram, due_dates: Iterable[datetime], now: datetime) -> None:
+    """
+    Records how late things due at `due_dates` are handled at `now`, things handled ahead of time are skipped.
+
+    """
+    for due_date in due_dates:
+        lag = (now - due_date).total_seconds()
+        if lag >= 0:
+            histogram.observe(lag)
+
+
+# pid of process which claimed slot (forked processes claim their own), slot
+_snapshot_slot: Tuple[Optional[int], int] = (None, 0)
+_snapshot_slot_lock = threading.Lock()
+
+
+def _claim_snapshot_slot() -> int:
+    try:
+        return cache.incr(SNAPSHOT_SLOTS_KEY)
+    except ValueError:
+        if cache.add(SNAPSHOT_SLOTS_KEY, 1, timeout=None):
+            return 1
+        return cache.incr(SNAPSHOT_SLOTS_KEY)
+
+
+def _process_snapshot_key(claim: bool = True) -> Optional[str]:
+    global _snapshot_slot
+    with _snapshot_slot_lock:
+        if _snapshot_slot[0] != os.getpid():
+            if not claim:
+                return None
+            _snapshot_slot = (os.getpid(), _claim_snapshot_slot())
+        return f"{SNAPSHOT_KEY_PREFIX}{_snapshot_slot[1]}"
+
+
+def save_snapshot() -> None:
+    """
+    Saves metrics of this process in cache, so they are rendered by `/metrics` served by other processes.
+
+    Snapshot expires after METRICS_SNAPSHOT_TIMEOUT seconds unless process saves it again.
+    Processes never write shared keys, so concurrent saves never overwrite each other.
+    """
+    cache.set(_process_snapshot_key(), REGISTRY.snapshot(), timeout=settings.METRICS_SNAPSHOT_TIMEOUT)
+
+
+def load_snapshots() -> List[Dict[str, List]]:
+    """
+    Returns metrics snapshots saved by other processes (celery workers).
+
+    Slots of finished processes are empty once their snapshots expire.
+    """
+    own = _process_snapshot_key(claim=False)
+    keys = [f"{SNAPSHOT_KEY_PREFIX}{slot}" for slot in range(1, (cache.get(SNAPSHOT_SLOTS_KEY) or 0) + 1)]
+    return list(cache.get_many([k for k in keys if k != own]).values())
+
+
+def _processed_items(result) -> int:
+    if isinstance(result, (bool, int)):
+        return int(result)
+    if isinstance(result, dict):
+        return sum(v for v in result.values() if isinstance(v, int))
+    return 0
+
+
+# task id: start time, timings collector, timings
+_task_runs: Dict[str, Tuple[float, Any, Timings]] = {}
+
+
+@task_prerun.connect
+def _start_task_run(task_id: str, task, **kwargs) -> None:
+    collector = collect_timings()
+    _task_runs[task_id] = (time.perf_counter(), collector, collector.__enter__())
+
+
+@task_postrun.connect
+def _finish_task_run(task_id: str, task, retval=None, state: Optional[str] = None, **kwargs) -> None:
+    run = _task_runs.pop(task_id, None)
+    if run is None:
+        return
+    start, collector, timings = run
+    collector.__exit__(None, None, None)
+    TASK_RUNS.inc(task.name, state or "UNKNOWN")
+    TASK_DURATION.observe(time.perf_counter() - start, task.name)
+    TASK_DB_DURATION.observe(timings.db, task.name)
+    TASK_ITEMS.inc(task.name, amount=_processed_items(retval))
+    try:
+        save_snapshot()
+    except Exception as error:  # metrics never fail tasks
+        logger.warning("Metrics snapshot not saved: %s", error)
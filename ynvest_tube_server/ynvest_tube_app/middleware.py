@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from ynvest_tube_server.ynvest_tube_app.metrics import (
+    REQUEST_DB_DURATION,
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_SERIALIZATION_DURATION,
+    REQUESTS,
+    RESPONSE_SIZE,
+    Timings,
+    collect_timings,
+)
+
+
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response: Callable) -> Callable:
+    """
+    Routes requests served through ASGI with ASGI_URLCONF, so they are handled by async views.
+
+    Under WSGI requests are routed with ROOT_URLCONF as before.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request: HttpRequest) -> HttpResponse:
+            request.urlconf = settings.ASGI_URLCONF
+            return await get_response(request)
+
+        return middleware
+
+    return get_response
+
+
+def _record(request: HttpRequest, response: HttpResponse, timings: Timings, duration: float) -> None:
+    match = request.resolver_match
+    view = match.view_name if match else "unmatched"
+    method = request.method
+    REQUESTS.inc(view, method, str(response.status_code))
+    REQUEST_DURATION.observe(duration, view, method)
+    REQUEST_DB_DURATION.observe(timings.db, view, method)
+    REQUEST_SERIALIZATION_DURATION.observe(timings.serialization, view, method)
+    REQUEST_QUERIES.observe(timings.queries, view, method)
+    if not response.streaming:
+        RESPONSE_SIZE.observe(len(response.content), view, method)
+    response["Server-Timing"] = (
+        f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries", '
+        f"serialization;dur={timings.serialization * 1000:.2f}, "
+        f"total;dur={duration * 1000:.2f}"
+    )
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response: Callable) -> Callable:
+    """
+    Measures each request: queries count, database time, serialization time, response size and total time.
+
+    Measurements are recorded in metrics exposed by `/metrics` and sent back in Server-Timing header.
+    Streamed responses are measured until streaming starts.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request: HttpRequest) -> HttpResponse:
+            start = time.perf_counter()
+            with collect_timings() as timings:
+                response = await get_response(request)
+            _record(request, response, timings, time.perf_counter() - start)
+            return response
+
+        return middleware
+
+    def middleware(request: HttpRequest) -> HttpResponse:
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            response = get_response(request)
+        _record(request, response, timings, time.perf_counter() - start)
+        return response
+
+    return middleware
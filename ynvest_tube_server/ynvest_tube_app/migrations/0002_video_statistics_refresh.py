@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ynvest_tube_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='statistics_updated_at',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='next_statistics_refresh',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ynvest_tube_app', '0002_video_statistics_refresh'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['state', 'auction_expiration_date'], name='auction_state_expiration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['last_bidder', 'state'], name='auction_bidder_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bids',
+            index=models.Index(fields=['user', 'auction'], name='bids_user_auction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rent',
+            index=models.Index(fields=['state', 'auction'], name='rent_state_auction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rent',
+            index=models.Index(fields=['user', 'state'], name='rent_user_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['state'], name='video_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['next_statistics_refresh'], name='video_next_refresh_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations, models
+
+VIDEO_STATES = {"available": 0, "auctioned": 1, "rented": 2}
+ACTIVITY_STATES = {"inactive": 0, "active": 1}
+STATEFUL_MODELS = (("video", VIDEO_STATES), ("auction", ACTIVITY_STATES), ("rent", ACTIVITY_STATES))
+
+
+def encode_states(apps, schema_editor):
+    for model_name, states in STATEFUL_MODELS:
+        model = apps.get_model("ynvest_tube_app", model_name)
+        for name, code in states.items():
+            # old choices keys were uppercase while code wrote lowercase values
+            model.objects.filter(state__iexact=name).update(state_code=code)
+
+
+def decode_states(apps, schema_editor):
+    for model_name, states in STATEFUL_MODELS:
+        model = apps.get_model("ynvest_tube_app", model_name)
+        for name, code in states.items():
+            model.objects.filter(state_code=code).update(state=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ynvest_tube_app", "0003_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name="auction", name="auction_state_expiration_idx"),
+        migrations.RemoveIndex(model_name="auction", name="auction_bidder_state_idx"),
+        migrations.RemoveIndex(model_name="rent", name="rent_state_auction_idx"),
+        migrations.RemoveIndex(model_name="rent", name="rent_user_state_idx"),
+        migrations.RemoveIndex(model_name="video", name="video_state_idx"),
+        migrations.AddField(
+            model_name="video",
+            name="state_code",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="state_code",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="rent",
+            name="state_code",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.RunPython(encode_states, decode_states),
+        migrations.RemoveField(model_name="video", name="state"),
+        migrations.RemoveField(model_name="auction", name="state"),
+        migrations.RemoveField(model_name="rent", name="state"),
+        migrations.RenameField(model_name="video", old_name="state_code", new_name="state"),
+        migrations.RenameField(model_name="auction", old_name="state_code", new_name="state"),
+        migrations.RenameField(model_name="rent", old_name="state_code", new_name="state"),
+        migrations.AlterField(
+            model_name="video",
+            name="state",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "available"), (1, "auctioned"), (2, "rented")], default=0
+            ),
+        ),
+        migrations.AlterField(
+            model_name="auction",
+            name="state",
+            field=models.PositiveSmallIntegerField(choices=[(0, "inactive"), (1, "active")], default=1),
+        ),
+        migrations.AlterField(
+            model_name="rent",
+            name="state",
+            field=models.PositiveSmallIntegerField(choices=[(0, "inactive"), (1, "active")], default=1),
+        ),
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                condition=models.Q(state=1), fields=["auction_expiration_date"], name="auction_active_expiration_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(fields=["last_bidder", "state"], name="auction_bidder_state_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="rent",
+            index=models.Index(condition=models.Q(state=1), fields=["auction"], name="rent_active_auction_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="rent",
+            index=models.Index(fields=["user", "state"], name="rent_user_state_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(fields=["state"], name="video_state_idx"),
+        ),
+    ]
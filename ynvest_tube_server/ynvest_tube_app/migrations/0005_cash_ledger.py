@@ -0,0 +1,65 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+OPENING_BALANCE = 0
+CHUNK_SIZE = 10000
+
+
+def open_balances(apps, schema_editor):
+    """
+    Records current cash of every user as its opening balance, so ledger sums match existing balances.
+
+    """
+    user_model = apps.get_model("ynvest_tube_app", "User")
+    ledger_model = apps.get_model("ynvest_tube_app", "CashLedger")
+    users = user_model.objects.order_by("pk").values_list("pk", "cash")
+    last_id = None
+    while True:
+        chunk = list((users.filter(pk__gt=last_id) if last_id else users)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        ledger_model.objects.bulk_create(
+            ledger_model(user_id=user_id, amount=cash, operation=OPENING_BALANCE) for user_id, cash in chunk
+        )
+        last_id = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ynvest_tube_app", "0004_state_enums"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CashLedger",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("amount", models.IntegerField()),
+                (
+                    "operation",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "opening_balance"),
+                            (1, "bid"),
+                            (2, "refund"),
+                            (3, "rent_settlement"),
+                            (4, "loyalty_payout"),
+                            (5, "adjustment"),
+                        ]
+                    ),
+                ),
+                ("reference", models.CharField(blank=True, default="", max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="ynvest_tube_app.user"),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="cashledger",
+            index=models.Index(fields=["user", "id"], name="cash_ledger_user_idx"),
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ynvest_tube_app", "0005_cash_ledger"),
+    ]
+
+    operations = [
+        # creation date was overwritten on every user save
+        migrations.AlterField(
+            model_name="user",
+            name="creation_date",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["creation_date"], name="user_creation_date_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="cashledger",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("operation", 4)),
+                fields=("user", "reference"),
+                name="cash_ledger_loyalty_once",
+            ),
+        ),
+    ]
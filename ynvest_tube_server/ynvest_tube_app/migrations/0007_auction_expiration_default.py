@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+import ynvest_tube_server.ynvest_tube_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ynvest_tube_app", "0006_loyalty_payout"),
+    ]
+
+    operations = [
+        # default was evaluated once, at import time
+        migrations.AlterField(
+            model_name="auction",
+            name="auction_expiration_date",
+            field=models.DateTimeField(
+                default=ynvest_tube_server.ynvest_tube_app.models.default_auction_expiration_date
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicated_videos(apps, schema_editor):
+    """
+    Keeps the oldest video of each duplicated link, auctions of other copies are moved to it.
+
+    """
+    video_model = apps.get_model("ynvest_tube_app", "Video")
+    auction_model = apps.get_model("ynvest_tube_app", "Auction")
+    duplicated = video_model.objects.values("link").annotate(copies=Count("id"), kept_id=Min("id")).filter(copies__gt=1)
+    for d in duplicated:
+        copies = video_model.objects.filter(link=d["link"]).exclude(id=d["kept_id"])
+        auction_model.objects.filter(video__in=copies).update(video_id=d["kept_id"])
+        copies.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ynvest_tube_app", "0007_auction_expiration_default"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicated_videos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="video",
+            constraint=models.UniqueConstraint(fields=("link",), name="video_link_unique"),
+        ),
+    ]
@@ -1,7 +1,7 @@
 import uuid
 from typing import Dict
 
-from django.db.models import CASCADE, ForeignKey
+from django.db.models import CASCADE, ForeignKey, Q
 from django.db import models
 from django.utils import timezone
 
@@ -21,10 +21,57 @@ class Serializable:
         dictionary = {}
         for field in self._meta.fields:
             value = self.__getattribute__(field.name)
+            if field.choices:
+                value = self._get_FIELD_display(field)
             dictionary[field.name] = value.serialize() if isinstance(field, ForeignKey) and value is not None else value
         return dictionary
 
 
+class VideoState(models.IntegerChoices):
+    """
+    Video states, labels are used in API.
+
+    """
+
+    AVAILABLE = 0, "available"
+    AUCTIONED = 1, "auctioned"
+    RENTED = 2, "rented"
+
+
+class AuctionState(models.IntegerChoices):
+    """
+    Auction states, labels are used in API.
+
+    """
+
+    INACTIVE = 0, "inactive"
+    ACTIVE = 1, "active"
+
+
+class RentState(models.IntegerChoices):
+    """
+    Rent states, labels are used in API.
+
+    """
+
+    INACTIVE = 0, "inactive"
+    ACTIVE = 1, "active"
+
+
+class CashOperation(models.IntegerChoices):
+    """
+    Kinds of user cash movements.
+
+    """
+
+    OPENING_BALANCE = 0, "opening_balance"
+    BID = 1, "bid"
+    REFUND = 2, "refund"
+    RENT_SETTLEMENT = 3, "rent_settlement"
+    LOYALTY_PAYOUT = 4, "loyalty_payout"
+    ADJUSTMENT = 5, "adjustment"
+
+
 class Video(models.Model, Serializable):
     """
     Model represents youtube video.
@@ -38,9 +85,26 @@ class Video(models.Model, Serializable):
     views = models.IntegerField(null=True, default=None)
     likes = models.IntegerField(null=True, default=None)
     dislikes = models.IntegerField(null=True, default=None)
-    state = models.TextField(
-        default="available", choices=(("RENTED", "rented"), ("AUCTIONED", "auctioned"), ("AVAILABLE", "available"))
-    )
+    state = models.PositiveSmallIntegerField(default=VideoState.AVAILABLE, choices=VideoState.choices)
+    statistics_updated_at = models.DateTimeField(null=True, default=None)
+    # statistics refresh queue key, null means never refreshed
+    next_statistics_refresh = models.DateTimeField(null=True, default=None)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state"], name="video_state_idx"),
+            models.Index(fields=["next_statistics_refresh"], name="video_next_refresh_idx"),
+        ]
+        constraints = [
+            # youtube video id, each video is inserted once
+            models.UniqueConstraint(fields=["link"], name="video_link_unique"),
+        ]
+
+    def serialize(self: models.Model) -> Dict:
+        d = super().serialize()
+        del d["statistics_updated_at"]
+        del d["next_statistics_refresh"]
+        return d
 
 
 class User(models.Model, Serializable):
@@ -51,7 +115,20 @@ class User(models.Model, Serializable):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     cash = models.IntegerField(default=1000, null=False)
-    creation_date = models.DateTimeField(auto_now=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["creation_date"], name="user_creation_date_idx"),
+        ]
+
+
+def default_auction_expiration_date():
+    """
+    Auctions last one hour unless specified, evaluated for each auction.
+
+    """
+    return timezone.now() + timezone.timedelta(hours=1)
 
 
 class Auction(models.Model, Serializable):
@@ -61,17 +138,27 @@ class Auction(models.Model, Serializable):
     """
 
     id = models.AutoField(primary_key=True)
-    state = models.TextField(default="active", choices=(("ACTIVE", "active"), ("INACTIVE", "inactive")))
+    state = models.PositiveSmallIntegerField(default=AuctionState.ACTIVE, choices=AuctionState.choices)
     starting_price = models.IntegerField(null=False)
     last_bid_value = models.IntegerField(null=True, default=None)
     last_bidder = models.ForeignKey(User, null=True, default=None, on_delete=CASCADE)
     video = models.ForeignKey(Video, on_delete=CASCADE)
     rental_duration = models.DurationField()
     # rental_begin_date = models.DateTimeField(auto_now=True)
-    auction_expiration_date = models.DateTimeField(default=timezone.now() + timezone.timedelta(hours=1))
+    auction_expiration_date = models.DateTimeField(default=default_auction_expiration_date)
     rental_expiration_date = models.DateTimeField()
     video_views_on_sold = models.IntegerField(null=True, default=None)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["auction_expiration_date"],
+                condition=Q(state=AuctionState.ACTIVE),
+                name="auction_active_expiration_idx",
+            ),
+            models.Index(fields=["last_bidder", "state"], name="auction_bidder_state_idx"),
+        ]
+
     def serialize(self: models.Model) -> Dict:
         d = super().serialize()
         del d["last_bidder"]
@@ -87,9 +174,15 @@ class Rent(models.Model, Serializable):
     id = models.AutoField(primary_key=True)
     auction = models.ForeignKey(Auction, on_delete=CASCADE)
     user = models.ForeignKey(User, on_delete=CASCADE)
-    state = models.TextField(default="active", choices=(("ACTIVE", "active"), ("INACTIVE", "inactive")))
+    state = models.PositiveSmallIntegerField(default=RentState.ACTIVE, choices=RentState.choices)
     profit = models.IntegerField(null=True, default=None)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["auction"], condition=Q(state=RentState.ACTIVE), name="rent_active_auction_idx"),
+            models.Index(fields=["user", "state"], name="rent_user_state_idx"),
+        ]
+
 
 class Bids(models.Model, Serializable):
     """
@@ -102,3 +195,38 @@ class Bids(models.Model, Serializable):
     auction = models.ForeignKey(Auction, on_delete=CASCADE)
     user = models.ForeignKey(User, on_delete=CASCADE)
     value = models.IntegerField(null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "auction"], name="bids_user_auction_idx"),
+        ]
+
+
+class CashLedger(models.Model):
+    """
+    Append-only history of user cash movements.
+
+    Sum of user entries is user balance, `User.cash` is its materialized value updated in the same transaction
+    as entries are inserted. Entries are never updated nor deleted, corrections are new entries.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=CASCADE)
+    amount = models.IntegerField(null=False)
+    operation = models.PositiveSmallIntegerField(choices=CashOperation.choices)
+    # source of movement, e.g. `auction:12`, `rent:7`
+    reference = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="cash_ledger_user_idx"),
+        ]
+        constraints = [
+            # loyalty payout reference identifies payout period
+            models.UniqueConstraint(
+                fields=["user", "reference"],
+                condition=Q(operation=CashOperation.LOYALTY_PAYOUT),
+                name="cash_ledger_loyalty_once",
+            ),
+        ]
@@ -0,0 +1,189 @@
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import QuerySet
+
+from ynvest_tube_server.ynvest_tube_app.metrics import measure_serialization
+from ynvest_tube_server.ynvest_tube_app.models import Auction, Bids, Rent, User, Video
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def dumps(data) -> bytes:
+    """
+    Encodes data to json, using orjson when available.
+
+    Dates, times and durations are encoded like DjangoJSONEncoder does, so output does not depend on encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_django_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class ModelSerializer:
+    """
+    Compiled model serializer.
+
+    Field accessors are precomputed once per model. Foreign keys listed in `embed` are serialized as nested
+    dictionaries and fetched in the same query, other foreign keys are serialized as ids.
+    Fields with choices are serialized as choice labels.
+    """
+
+    def __init__(
+        self,
+        model: Type[models.Model],
+        exclude: Sequence[str] = (),
+        embed: Optional[Dict[str, "ModelSerializer"]] = None,
+    ) -> None:
+        self.model = model
+        self.exclude = tuple(exclude)
+        self.embed = embed or {}
+        self._projections = {}
+        # (key, attribute name, choice labels, embedded serializer)
+        self.accessors = []
+        for field in model._meta.concrete_fields:
+            if field.name in exclude:
+                continue
+            if field.name in self.embed:
+                self.accessors.append((field.name, field.name, None, self.embed[field.name]))
+            else:
+                labels = {value: label for value, label in field.flatchoices} if field.choices else None
+                self.accessors.append((field.name, field.attname, labels, None))
+
+        self.paths = []
+        self.related = []
+        for key, attname, _, embedded in self.accessors:
+            if embedded is None:
+                self.paths.append(attname)
+            else:
+                self.paths.extend(f"{key}__{path}" for path in embedded.paths)
+                self.related.append(key)
+                self.related.extend(f"{key}__{path}" for path in embedded.related)
+        self._build_row, _ = self._compile(0)
+
+    def _compile(self, offset: int) -> Tuple[Callable[[Sequence], Dict], int]:
+        """
+        Compiles function building dictionary from flat row of `paths` values starting at offset.
+
+        """
+        items = []
+        for key, _, labels, embedded in self.accessors:
+            if embedded is None:
+                items.append((key, offset, labels, None))
+                offset += 1
+            else:
+                build_embedded, end = embedded._compile(offset)
+                # embedded pk is its first path, None means null foreign key
+                items.append((key, offset, None, build_embedded))
+                offset = end
+
+        def build(row: Sequence) -> Dict:
+            dictionary = {}
+            for key, index, labels, build_embedded in items:
+                value = row[index]
+                if build_embedded is not None:
+                    dictionary[key] = build_embedded(row) if value is not None else None
+                elif labels is not None:
+                    dictionary[key] = labels.get(value, value)
+                else:
+                    dictionary[key] = value
+            return dictionary
+
+        return build, offset
+
+    def project(self, fields: Sequence[str]) -> "ModelSerializer":
+        """
+        Returns serializer limited to selected fields, primary key is always included.
+
+        Projected serializers fetch only columns of selected fields.
+
+        :param fields: names of fields, all fields if empty
+        :raises ValueError: if any of fields is not serialized by this serializer
+        """
+        if not fields:
+            return self
+        key = frozenset(fields)
+        if key not in self._projections:
+            available = [name for name, *_ in self.accessors]
+            unknown = key.difference(available)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+            pk = self.model._meta.pk.name
+            exclude = self.exclude + tuple(name for name in available if name not in key and name != pk)
+            embed = {name: serializer for name, serializer in self.embed.items() if name in key}
+            self._projections[key] = ModelSerializer(self.model, exclude, embed)
+        return self._projections[key]
+
+    def serialize(self, obj: models.Model) -> Dict:
+        """
+        Converts model instance to python dictionary.
+
+        Embedded foreign keys should be selected (select_related) to avoid additional queries.
+        """
+        dictionary = {}
+        for key, attname, labels, embedded in self.accessors:
+            value = getattr(obj, attname)
+            if embedded is not None:
+                dictionary[key] = embedded.serialize(value) if value is not None else None
+            elif labels is not None:
+                dictionary[key] = labels.get(value, value)
+            else:
+                dictionary[key] = value
+        return dictionary
+
+    def serialize_query_set(self, query_set: QuerySet) -> List[Dict]:
+        """
+        Serializes whole query set with one `.values_list()` query, embedded models included.
+
+        """
+        build = self._build_row
+        rows = list(query_set.values_list(*self.paths))
+        with measure_serialization():
+            return [build(row) for row in rows]
+
+    def iter_serialized(
+        self, query_set: QuerySet, extra: Sequence[str] = (), chunk_size: Optional[int] = None
+    ) -> Iterator[Tuple[Dict, Tuple]]:
+        """
+        Lazily serializes query set, yields serialized rows with values of `extra` fields not included in output.
+
+        :param query_set: query set to serialize
+        :param extra: additional fields paths fetched with each row
+        :param chunk_size: if given, rows are streamed from database in chunks of this size
+        :return: iterator of pairs serialized row, extra values
+        """
+        build, width = self._build_row, len(self.paths)
+        rows = query_set.values_list(*self.paths, *extra)
+        rows = rows.iterator(chunk_size=chunk_size) if chunk_size else rows
+        for row in rows:
+            yield build(row), row[width:]
+
+
+VIDEO_SERIALIZER = ModelSerializer(Video, exclude=("statistics_updated_at", "next_statistics_refresh"))
+USER_SERIALIZER = ModelSerializer(User)
+AUCTION_SERIALIZER = ModelSerializer(Auction, exclude=("last_bidder",), embed={"video": VIDEO_SERIALIZER})
+RENT_SERIALIZER = ModelSerializer(Rent, embed={"auction": AUCTION_SERIALIZER, "user": USER_SERIALIZER})
+BIDS_SERIALIZER = ModelSerializer(Bids, embed={"auction": AUCTION_SERIALIZER, "user": USER_SERIALIZER})
+
+SERIALIZERS = {
+    s.model: s for s in (VIDEO_SERIALIZER, USER_SERIALIZER, AUCTION_SERIALIZER, RENT_SERIALIZER, BIDS_SERIALIZER)
+}
+
+
+def serializer_for(model: Type[models.Model]) -> ModelSerializer:
+    return SERIALIZERS[model]
+
+
+def serialize(obj: models.Model) -> Dict:
+    """
+    Converts model instance to python dictionary with its model serializer.
+
+    """
+    return serializer_for(type(obj)).serialize(obj)
@@ -0,0 +1,114 @@
+import asyncio
+import io
+from typing import Any, Callable, Dict
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import QuerySet
+
+from ynvest_tube_server.ynvest_tube_app.events import get_broker
+from ynvest_tube_server.ynvest_tube_app.models import Bids, Rent, Video
+from ynvest_tube_server.ynvest_tube_app.serializers import dumps
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import (
+    database_sync_to_async,
+    export_chunk,
+    is_export_request,
+    load_page_params,
+    wrong_page_params_data,
+)
+
+# comment line sent when there are no events, keeps proxies from closing idle connection
+KEEPALIVE_INTERVAL = 15.0
+
+
+async def auction_events(scope, receive, send) -> None:
+    """
+    ASGI application streaming auction events as server-sent events.
+
+    Each event is sent as one `data:` line with json object, its `type` is one of
+        - bid - auction has been bid, `auction` id and `lastBidValue`
+        - auctions-created - new auctions, `auctions` ids
+        - auctions-closed - closed auctions, `auctions` ids
+
+    Stream lasts until client disconnects.
+    """
+    if scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"Used request method is not allowed for this endpoint."})
+        return
+
+    subscription = get_broker().subscribe()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            await asyncio.wait({message, disconnected}, timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                message.cancel()
+                break
+            if message.done():
+                body = b"data: " + message.result() + b"\n\n"
+            else:
+                message.cancel()
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        subscription.close()
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# exported rows by path, exports (`format=ndjson`) of these paths are served by `ndjson_export` under ASGI
+EXPORTS: Dict[str, Callable[[], QuerySet]] = {
+    "/videos": Video.objects.all,
+    "/rents": Rent.objects.all,
+    "/bids": Bids.objects.all,
+}
+
+
+def is_export(scope: Dict[str, Any]) -> bool:
+    return scope["path"] in EXPORTS and is_export_request(ASGIRequest(scope, io.BytesIO()))
+
+
+async def ndjson_export(scope, receive, send) -> None:
+    """
+    ASGI application streaming whole table as newline delimited json, see `views_helpers.shared.export_ndjson`.
+
+    Django iterates streamed responses synchronously within event loop, where database can not be used,
+    so each chunk is read by `export_chunk` awaited with `database_sync_to_async`.
+    """
+    request = ASGIRequest(scope, io.BytesIO())
+    if request.method != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"Used request method is not allowed for this endpoint."})
+        return
+    query_set = EXPORTS[scope["path"]]()
+    try:
+        params = load_page_params(request, query_set.model)
+    except ValueError as error:
+        await send({"type": "http.response.start", "status": 400, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": dumps(wrong_page_params_data(error))})
+        return
+
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+    read_chunk, after = database_sync_to_async(export_chunk), params.after
+    while True:
+        chunk, after = await read_chunk(query_set, params, after)
+        await send({"type": "http.response.body", "body": chunk, "more_body": after is not None})
+        if after is None:
+            break
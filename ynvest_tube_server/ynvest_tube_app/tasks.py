@@ -1,21 +1,139 @@
-import random
+import logging
+from typing import Dict, List, Optional
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
 from django.utils import timezone
 
 from ynvest_tube_server import celery_app
-from ynvest_tube_server.ynvest_tube_app.models import Auction, Video, Rent, User
+from ynvest_tube_server.ynvest_tube_app.auctions_cache import invalidate_auctions
+from ynvest_tube_server.ynvest_tube_app.market import get_market_config
+from ynvest_tube_server.ynvest_tube_app.models import (
+    Auction,
+    AuctionState,
+    Rent,
+    RentState,
+    User,
+    Video,
+    VideoState,
+)
 from ynvest_tube_server.ynvest_tube_app.tasks_service import (
-    set_video,
-    assign_rent,
-    collect_videos_statistics,
-    settle_user,
-    choose_loyalty_degree,
-    deactivate_rent,
+    close_auctions,
+    count_free_auction_slots,
+    generate_auctions,
+    insert_found_videos,
+    update_videos_statistics,
+    loyalty_period_reference,
+    loyalty_tiers,
+    pay_loyalty,
+    settle_rents,
+    task_lock,
 )
+from ynvest_tube_server.ynvest_tube_app.views_helpers.video import get_random_words
+from ynvest_tube_server.ynvest_tube_app.youtube_service import search_videos
+
+logger = logging.getLogger(__name__)
+
+
+def _eta_horizon() -> timezone.datetime:
+    """
+    Returns latest eta task may be scheduled at.
+
+    Broker redelivers eta task not acknowledged within visibility timeout to another worker, so tasks due later
+    would be duplicated.
+    """
+    return timezone.now() + timezone.timedelta(seconds=settings.CELERY_BROKER_TRANSPORT_OPTIONS["visibility_timeout"])
+
+
+def schedule_auctions_closing(auctions: List[Auction]) -> None:
+    """
+    Enqueues closing of each auction at its expiration date.
+
+    Auctions expiring beyond eta horizon are left to periodic closer.
+    """
+    horizon = _eta_horizon()
+    for a in auctions:
+        if a.auction_expiration_date <= horizon:
+            close_auction_on_expiration.apply_async((a.id,), eta=a.auction_expiration_date)
+
+
+def schedule_rents_settlement(auctions: List[Auction]) -> None:
+    """
+    Enqueues settlement of rent of each won auction at its rental expiration date.
+
+    Rents expiring beyond eta horizon are left to periodic settler.
+    """
+    horizon = _eta_horizon()
+    for a in auctions:
+        if a.rental_expiration_date <= horizon:
+            settle_auction_rent.apply_async((a.id,), eta=a.rental_expiration_date)
+
+
+def _due_rents(now: timezone.datetime) -> QuerySet:
+    return (
+        Rent.objects.select_related("auction__video")
+        .only(
+            "id",
+            "user_id",
+            "state",
+            "profit",
+            "auction__last_bid_value",
+            "auction__video_views_on_sold",
+            "auction__rental_expiration_date",
+            "auction__video__views",
+        )
+        .filter(auction__rental_expiration_date__lte=now, state=RentState.ACTIVE)
+        .order_by("id")
+    )
+
+
+@celery_app.task(name="close_auction_on_expiration")
+def close_auction_on_expiration(auction_id: int) -> bool:
+    """
+    Closes auction scheduled at its expiration date, then schedules settlement of its rent.
+
+    Auction closed in the meantime (by periodic closer or by hand) is skipped,
+    auction which expiration date has been postponed is scheduled again.
+
+    :return: true if auction has been closed
+    """
+    with transaction.atomic():
+        auction = (
+            Auction.objects.select_for_update(skip_locked=True)
+            .select_related("video")
+            .filter(id=auction_id, state=AuctionState.ACTIVE)
+            .first()
+        )
+        if auction is None:
+            return False
+        if auction.auction_expiration_date > timezone.now():
+            transaction.on_commit(lambda: schedule_auctions_closing([auction]))
+            return False
+        won = close_auctions([auction])
+    if auction.state != AuctionState.INACTIVE:
+        return False
+
+    schedule_rents_settlement(won)
+    logger.info("Closed auction #%s. Video: %s", auction_id, auction.video.title)
+    return True
+
+
+@celery_app.task(name="settle_auction_rent")
+def settle_auction_rent(auction_id: int) -> int:
+    """
+    Settles rent of auction scheduled at its rental expiration date.
+
+    :return: number of settled rents
+    """
+    settled = settle_rents(list(_due_rents(timezone.now()).filter(auction_id=auction_id)))
+    if settled:
+        logger.info("Settled rent of auction #%s.", auction_id)
+    return settled
 
 
 @celery_app.task(name="close_expired_auctions")
-def close_expired_auctions() -> None:
+def close_expired_auctions() -> int:
     """
     Periodic task close auctions that the expiry date has passed.
     by:
@@ -23,127 +141,187 @@ def close_expired_auctions() -> None:
             - assign auction to winning user by adding rent to Rent table or passing on none participants
             - charges user wallet
 
+    Auctions are closed on time by tasks scheduled at their expiration dates, this task is safety net for
+    auctions which scheduled closing has been lost (e.g. broker restart).
+    Auctions are closed in bulk in one transaction. Overlapping runs are skipped thanks to task lock.
 
-    :interval very often 1 per 1 s
-
+    :interval 1 per 60 s
+    :return: number of closed auctions
     """
-    auctions = Auction.objects.filter(state="active", auction_expiration_date__lte=timezone.now())
+    with task_lock("close_expired_auctions") as acquired:
+        if not acquired:
+            return 0
+        with transaction.atomic():
+            auctions = list(
+                Auction.objects.select_for_update(skip_locked=True)
+                .select_related("video")
+                .filter(state=AuctionState.ACTIVE, auction_expiration_date__lte=timezone.now())
+            )
+            won = close_auctions(auctions)
+        schedule_rents_settlement(won)
 
+    auctions = [a for a in auctions if a.state == AuctionState.INACTIVE]
     if auctions:
-        print("Searching for closeable auctions...")
-    for a in auctions:
-        a.state = "inactive"
-        if a.last_bidder is not None:
-            set_video(a.video, "rented")
-            assign_rent(a)
-        else:
-            set_video(a.video, "available")
-        a.save()
-    if auctions:
-        print(f"Closed {len(auctions)} auctions. \nList of closed videos: \n {[x.video.title for x in auctions]}.")
+        logger.info("Closed %d auctions.", len(auctions))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Closed videos: %s", [a.video.title for a in auctions])
+    return len(auctions)
 
 
 @celery_app.task(name="generate_auction")
-def generate_auction(max_auctions: int = 10, auction_interval: int = random.randint(5, 30)) -> None:
+def generate_auction(max_auctions: Optional[int] = None) -> int:
     """
-    Generates random auction with random available video.
+    Generates random auctions with random available videos, fills all free slots up to max auctions.
 
     auction cost = random between 200 and 500 coins  [[OLD]1-5 % of current video views]
 
     rent duration = random between 1 hour and 7 days
 
-    each auction lasts between auction_interval
+    each auction lasts between 5 and 30 minutes
 
     max auctions = 10
 
-    :interval 1 call per 1800 s
-    """
-    auction_timedelta = timezone.timedelta(minutes=auction_interval)
-    active_auctions = Auction.objects.filter(state="active", rental_expiration_date__gt=timezone.now())
-    if len(active_auctions) < max_auctions:
-        new_auction_id = len(Auction.objects.all())
-        print(f"Generating auction #{new_auction_id} ...")
-
-        available_videos = Video.objects.all().filter(state="available")
-        if available_videos:
-            v = random.choice(available_videos)
-            set_video(v, "auctioned")
-
-            random_time_delta = timezone.timedelta(days=random.randint(0, 6), hours=random.randint(1, 24))
-            auction = Auction(
-                starting_price=random.randint(200, 500),
-                # random.randint(int(1 / 100 * v.views), int(5 / 100 * v.views)),
-                video=v,
-                rental_duration=random_time_delta,
-                auction_expiration_date=timezone.now() + auction_timedelta,
-                rental_expiration_date=timezone.now() + random_time_delta,
-                video_views_on_sold=v.views,
-            )
-            auction.save()
+    Ranges and max auctions come from market config, read on each run.
+
+    :interval 1 call per 600 s
+    :return: number of generated auctions
+    """
+    with task_lock("generate_auction") as acquired:
+        if not acquired:
+            return 0
+        market = get_market_config()
+        max_auctions = market.max_active_auctions if max_auctions is None else max_auctions
+        free_slots = count_free_auction_slots(max_auctions)
+        if not free_slots:
+            return 0
+        logger.info("Generating %d auctions...", free_slots)
+        auctions = generate_auctions(free_slots, market)
+        schedule_auctions_closing(auctions)
 
-            print(f"Generated auction #{new_auction_id}. Auctioned video: {v.title}")
-        else:
-            print(f"Auction #{new_auction_id} generation failed. \nReason: `No available videos in database`")
+    if auctions:
+        logger.info("Generated %d auctions.", len(auctions))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Auctioned videos: %s", [a.video.title for a in auctions])
+    else:
+        logger.warning("Auctions generation failed. Reason: `No available videos in database`")
+    return len(auctions)
 
 
-@celery_app.task(name="update_video_views")
-def update_videos_views() -> None:
+@celery_app.task(name="insert_youtube_videos")
+def insert_youtube_videos(words_count: int = 5, videos_per_word: int = 5) -> int:
     """
-    Updates statistics views, likes and dislikes of each video in database via youtube data api v3.
+    Inserts videos found on youtube by random english words.
 
-    For now user's cash is being increased by views difference. (rent start, rent end)
+    Words are searched concurrently, found videos are inserted with one bulk insert, those already
+    in database are skipped.
 
-    :interval 1 call per day
+    :return: number of inserted videos
     """
-    print("Updating videos statistics...")
+    found = search_videos(get_random_words(words_count), results_per_phrase=videos_per_word)
+    inserted = insert_found_videos(found)
+    logger.info("Inserted %d of %d found videos.", inserted, len(found))
+    return inserted
 
-    objects = list(Video.objects.all())
-    videos_statistics = collect_videos_statistics(objects)
 
-    for obj, stats in zip(objects, videos_statistics):
-        stats = stats["statistics"]
-        obj.likes = stats["likeCount"]
-        obj.dislikes = stats["dislikeCount"]
-        obj.views = stats["viewCount"]
-        obj.save()
+@celery_app.task(name="update_video_views")
+def update_videos_views(chunk_size: int = 1000, max_videos: int = 50000) -> Dict[str, int]:
+    """
+    Updates statistics views, likes and dislikes of videos due to refresh via youtube data api v3.
 
-    print(f"Updated {len(objects)} videos statistics.")
+    Videos form priority queue ordered by next statistics refresh date, which depends on video state,
+    so rented and auctioned videos are refreshed often and available ones rarely.
+    Rented videos are also refreshed just before their rent settlement.
 
+    Due videos are processed in chunks of `chunk_size`, statistics of chunk are fetched concurrently
+    and saved with one bulk update. Cached auction pages embed videos, so they are invalidated only when
+    statistics of a video of any auction have changed.
 
-@celery_app.task(name="settle_rents")
-def settle_users_rents() -> None:
-    """
-    When user rent expires it comes to a payday and he gets settled.
+    For now user's cash is being increased by views difference. (rent start, rent end)
 
-    :interval 1 call per 1 s
+    :interval 1 call per 60 s
+    :return: number of refreshed videos in each state
     """
-    rents = list(Rent.objects.filter(auction__rental_expiration_date__lte=timezone.now(), state="active"))
-    if rents:
-        print(f"Settling rents...")
+    refreshed = {state: 0 for state in settings.VIDEO_STATISTICS_REFRESH_INTERVALS}
+    with task_lock("update_video_views", timeout=3600) as acquired:
+        if not acquired:
+            return refreshed
+        now, processed, listed_changed = timezone.now(), 0, False
+        due_videos = (
+            Video.objects.only("id", "link", "state", "views", "likes", "dislikes")
+            .filter(Q(next_statistics_refresh__isnull=True) | Q(next_statistics_refresh__lte=now))
+            .order_by(F("next_statistics_refresh").asc(nulls_first=True), "id")
+        )
+        while processed < max_videos:
+            chunk = list(due_videos[: min(chunk_size, max_videos - processed)])
+            if not chunk:
+                break
+            changed = update_videos_statistics(chunk)
+            if changed and not listed_changed:
+                listed_changed = Auction.objects.filter(video_id__in=changed).exists()
+            for v in chunk:
+                refreshed[VideoState(v.state).label] += 1
+            processed += len(chunk)
+
+    if listed_changed:
+        # listed auctions embed videos statistics
+        invalidate_auctions()
+    if processed:
+        logger.info("Updated %d videos statistics. Refreshed videos by state: %s.", processed, refreshed)
+    return refreshed
 
-    for r in rents:
-        u, a, v = r.user, r.auction, r.auction.video
-        views_diff = v.views - a.video_views_on_sold
-        print(f"Video `{v.title}` views increased by {views_diff}.")
 
-        settle_user(u, views_diff)
-        set_video(v, "available")
-        deactivate_rent(r, views_diff)
+@celery_app.task(name="settle_rents")
+def settle_users_rents(chunk_size: int = 1000) -> int:
+    """
+    When user rent expires it comes to a payday and he gets settled.
 
-    if rents:
-        print(f"Settled {len(rents)} rents.")
+    Rents are settled on time by tasks scheduled at their rental expiration dates, this task is safety net for
+    rents which scheduled settlement has been lost.
+    Due rents are settled in chunks of `chunk_size` rents, each one in its own transaction,
+    so memory usage and transaction size stay bounded whatever the backlog is.
+
+    :interval 1 call per 300 s
+    :return: number of settled rents
+    """
+    with task_lock("settle_rents", timeout=600) as acquired:
+        if not acquired:
+            return 0
+        due_rents, last_id, settled = _due_rents(timezone.now()), 0, 0
+        while True:
+            rents = list(due_rents.filter(id__gt=last_id)[:chunk_size])
+            if not rents:
+                break
+            settled += settle_rents(rents)
+            last_id = rents[-1].id
+
+    if settled:
+        logger.info("Settled %d rents.", settled)
+    return settled
 
 
 @celery_app.task(name="payout_loyalty_cash")
-def payout_loyalty_cash() -> None:
+def payout_loyalty_cash(chunk_size: int = 10000) -> int:
     """
     Periodically payouts loyal free cash.
 
-    Counts since registration.
+    Counts since registration. Users of each loyalty degree are selected by registration date range
+    and paid in bulk, each user at most once per payout period, so retried task never pays twice.
 
     :interval 1 call per 7 days
+    :return: number of paid users
     """
-    users = User.objects.all()
-    for u in users:
-        d = (timezone.now() - u.creation_date).days
-        settle_user(u, choose_loyalty_degree(d))
+    paid = 0
+    with task_lock("payout_loyalty_cash", timeout=3600) as acquired:
+        if not acquired:
+            return paid
+        now = timezone.now()
+        reference = loyalty_period_reference(now)
+        for min_days, max_days, payout in loyalty_tiers():
+            users = User.objects.filter(creation_date__gt=now - timezone.timedelta(days=max_days))
+            if min_days is not None:
+                users = users.filter(creation_date__lte=now - timezone.timedelta(days=min_days))
+            paid += pay_loyalty(users, payout, reference, chunk_size)
+
+    if paid:
+        logger.info("Paid loyalty cash to %d users (%s).", paid, reference)
+    return paid
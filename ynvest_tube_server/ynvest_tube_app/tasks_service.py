@@ -1,59 +1,302 @@
-from ynvest_tube_server.settings import youtube
-from typing import List
-import sys
+import logging
+import random
+from collections import defaultdict
+from contextlib import contextmanager
 
-from ynvest_tube_server.ynvest_tube_app.models import Auction, Video, Rent, User
+from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, QuerySet
+from django.utils import timezone
 
-def set_video(video: Video, state: str) -> None:
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ynvest_tube_server.ynvest_tube_app.auctions_cache import invalidate_auctions_on_commit
+from ynvest_tube_server.ynvest_tube_app.events import publish_event
+from ynvest_tube_server.ynvest_tube_app.market import MarketConfig
+from ynvest_tube_server.ynvest_tube_app.metrics import AUCTION_CLOSE_LAG, RENT_SETTLEMENT_LAG, observe_lags
+from ynvest_tube_server.ynvest_tube_app.models import (
+    Auction,
+    AuctionState,
+    CashLedger,
+    CashOperation,
+    Rent,
+    RentState,
+    User,
+    Video,
+    VideoState,
+)
+from ynvest_tube_server.ynvest_tube_app.views_helpers.video import fix_punctuation_marks
+from ynvest_tube_server.ynvest_tube_app.youtube_service import fetch_videos_statistics
+
+logger = logging.getLogger(__name__)
+
+
+def close_auctions(auctions: List[Auction]) -> List[Auction]:
+    """
+    Close auctions in bulk
+            - changing auctions state to inactive
+            - videos of won auctions become rented and rents are assigned to winners
+            - videos of auctions without participants become available again
+
+    Query count does not depend on auctions count, all changes are made in one transaction.
+    Only auctions still active are closed, auctions closed in the meantime (concurrently or by hand) are skipped,
+    so rent is never assigned twice. Skipped auctions are left unchanged in memory.
+    Cached auction pages are invalidated and `auctions-closed` event is published after commit.
+
+    :param auctions: auctions to close, with `video` selected
+    :return: won auctions, rents of them have been assigned
+    """
+    if not auctions:
+        return []
+    now = timezone.now()
+
+    with transaction.atomic():
+        active = Auction.objects.filter(id__in=[a.id for a in auctions], state=AuctionState.ACTIVE)
+        ids = set(active.select_for_update().values_list("id", flat=True))
+        if active.filter(id__in=ids).update(state=AuctionState.INACTIVE) != len(ids):
+            # closed concurrently between select and update, possible on backends without row locks
+            transaction.set_rollback(True)
+            return []
+        auctions = [a for a in auctions if a.id in ids]
+        if not auctions:
+            return []
+        won = [a for a in auctions if a.last_bidder_id is not None]
+        passed = [a for a in auctions if a.last_bidder_id is None]
+        # rented videos statistics are planned against rental expiration on next refresh
+        Video.objects.filter(id__in=[a.video_id for a in won]).update(
+            state=VideoState.RENTED, next_statistics_refresh=now
+        )
+        Video.objects.filter(id__in=[a.video_id for a in passed]).update(state=VideoState.AVAILABLE)
+        Rent.objects.bulk_create([Rent(auction=a, user_id=a.last_bidder_id) for a in won])
+        invalidate_auctions_on_commit()
+        publish_event({"type": "auctions-closed", "auctions": [a.id for a in auctions]})
+
+    for a in auctions:
+        a.state = AuctionState.INACTIVE
+        a.video.state = VideoState.RENTED if a.last_bidder_id is not None else VideoState.AVAILABLE
+    observe_lags(AUCTION_CLOSE_LAG, [a.auction_expiration_date for a in auctions], now)
+    return won
+
+
+def count_free_auction_slots(max_auctions: int) -> int:
+    """
+    Counts auctions missing to `max_auctions` active ones, with one COUNT query.
+
+    """
+    active = Auction.objects.filter(state=AuctionState.ACTIVE, rental_expiration_date__gt=timezone.now()).count()
+    return max(0, max_auctions - active)
+
+
+def sample_available_videos_ids(count: int) -> List[int]:
+    """
+    Draws up to `count` distinct random available videos without loading them all.
+
+    Random distinct offsets are drawn from available videos count, each offset is read with single row query.
+
+    :param count: number of videos to draw
+    :return: ids of drawn videos
+    """
+    available = Video.objects.filter(state=VideoState.AVAILABLE).order_by("id").values_list("id", flat=True)
+    total = available.count()
+    ids = []
+    for offset in sorted(random.sample(range(total), min(count, total))):
+        # empty if videos have been auctioned concurrently
+        ids.extend(available[offset : offset + 1])
+    return ids
+
+
+def generate_auctions(count: int, market: MarketConfig) -> List[Auction]:
+    """
+    Creates up to `count` auctions of random available videos, with one bulk insert and one videos update.
+
+    Auction duration, starting price and rental duration are drawn for each auction from market config.
+
+    :param count: number of auctions to create
+    :param market: market config
+    :return: created auctions, less than `count` if there is not enough available videos
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        videos = list(
+            Video.objects.select_for_update()
+            .filter(id__in=sample_available_videos_ids(count), state=VideoState.AVAILABLE)
+            .only("id", "title", "views")
+        )
+        auctions = []
+        for v, auction_duration in zip(videos, market.auction_durations(len(videos))):
+            rental_duration = market.draw_rental_duration()
+            auctions.append(
+                Auction(
+                    starting_price=market.draw_starting_price(),
+                    video=v,
+                    rental_duration=rental_duration,
+                    auction_expiration_date=now + auction_duration,
+                    rental_expiration_date=now + rental_duration,
+                    video_views_on_sold=v.views,
+                )
+            )
+        Video.objects.filter(id__in=[v.id for v in videos]).update(state=VideoState.AUCTIONED)
+        Auction.objects.bulk_create(auctions)
+        if auctions and auctions[0].pk is None:
+            # backends not returning ids from bulk insert, video has at most one active auction
+            ids = dict(
+                Auction.objects.filter(video_id__in=[v.id for v in videos], state=AuctionState.ACTIVE).values_list(
+                    "video_id", "id"
+                )
+            )
+            for a in auctions:
+                a.pk = ids[a.video_id]
+        invalidate_auctions_on_commit()
+        if auctions:
+            publish_event({"type": "auctions-created", "auctions": [a.id for a in auctions]})
+    return auctions
+
+
+@contextmanager
+def task_lock(name: str, timeout: int = 60) -> Iterator[bool]:
+    """
+    Non blocking lock shared by all workers, kept in cache.
+
+    Prevents overlapping runs of the same periodic task.
+
+    :param name: lock name, usually task name
+    :param timeout: lock expiration in seconds, protects from never released lock after worker crash
+    :return: true if lock has been acquired
     """
-    Set video state.
+    key = f"task-lock:{name}"
+    acquired = cache.add(key, True, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(key)
+
 
+def move_cash(entries: List[CashLedger]) -> None:
     """
-    video.state = state
-    video.save()
+    Records cash movements in ledger and applies them to users cash.
 
+    Entries are inserted with bulk insert and cash is updated with one `F()` update per user,
+    all in one transaction.
 
-def assign_rent(auction: Auction) -> None:
+    :param entries: new ledger entries
     """
-    Handle rent in system
+    totals = defaultdict(int)
+    for e in entries:
+        totals[e.user_id] += e.amount
+
+    with transaction.atomic():
+        CashLedger.objects.bulk_create(entries, batch_size=1000)
+        for user_id, amount in totals.items():
+            if amount:
+                User.objects.filter(id=user_id).update(cash=F("cash") + amount)
+
 
+def update_videos_statistics(videos: List[Video], client_factory: Optional[Callable[[], Any]] = None) -> List[int]:
     """
-    r = Rent(auction=auction, user=auction.last_bidder)
-    r.save()
+    Collects statistics of videos from youtube API and writes them back with one bulk update.
 
+    Statistics are matched with videos by youtube video id, videos omitted by youtube keep old statistics.
+    Next statistics refresh of every video is planned according to its state.
 
-def settle_user(user: User, value: int) -> None:
+    :param videos: list of videos
+    :param client_factory: youtube client factory, by default configured one
+    :return: ids of videos which views, likes or dislikes have changed
     """
-    Reduce user cash
+    now = timezone.now()
+    statistics = fetch_videos_statistics([v.link for v in videos], client_factory=client_factory)
+    changed = []
+    for v in videos:
+        stats = statistics.get(v.link)
+        if stats is not None:
+            previous = (v.views, v.likes, v.dislikes)
+            v.views = _as_int(stats.get("viewCount"))
+            v.likes = _as_int(stats.get("likeCount"))
+            v.dislikes = _as_int(stats.get("dislikeCount"))
+            v.statistics_updated_at = now
+            if (v.views, v.likes, v.dislikes) != previous:
+                changed.append(v.id)
+    plan_statistics_refresh(videos, now)
+    Video.objects.bulk_update(
+        videos, ["views", "likes", "dislikes", "statistics_updated_at", "next_statistics_refresh"]
+    )
+    return changed
 
+
+def insert_found_videos(found: List[Dict]) -> int:
     """
-    # print(f' {user} settled by {value}')
-    user.cash += value
-    user.save()
+    Inserts videos found on youtube with one bulk insert, videos already in database are skipped.
 
+    Links are unique, so videos inserted concurrently by other process are skipped by database.
 
-def collect_videos_statistics(objects: List, result_limit: int = 50) -> List:
+    :param found: videos with `id`, `snippet` and `statistics`, as returned by youtube search
+    :return: number of videos which were not in database
     """
-    Calls youtube API to collect data about videos statistics in objects list.
+    found = list({f["id"]: f for f in found}.values())
+    existing = set(Video.objects.filter(link__in=[f["id"] for f in found]).values_list("link", flat=True))
+    now = timezone.now()
+    videos = [
+        Video(
+            title=fix_punctuation_marks(f["snippet"]["title"]),
+            description=fix_punctuation_marks(f["snippet"]["description"]),
+            link=f["id"],
+            likes=_as_int(f["statistics"].get("likeCount")),
+            views=_as_int(f["statistics"].get("viewCount")),
+            dislikes=_as_int(f["statistics"].get("dislikeCount")),
+            statistics_updated_at=now,
+        )
+        for f in found
+        if f["id"] not in existing
+    ]
+    plan_statistics_refresh(videos, now)
+    Video.objects.bulk_create(videos, batch_size=1000, ignore_conflicts=True)
+    return len(videos)
+
+
+def _as_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value is not None else None
+
 
-    response limit result is 50, so we need to call api len(video_rows)/50 times
+def plan_statistics_refresh(videos: List[Video], now: datetime) -> None:
+    """
+    Sets next statistics refresh date of videos.
 
-    :param objects: list of videos
-    :param result_limit: youtube api limits result rows to 50
+    Each video state has its own refresh interval (VIDEO_STATISTICS_REFRESH_INTERVALS),
+    rented video is additionally refreshed just before its rent settlement.
 
-    :return: List of dictionaries containing statistics about each video in objects list
+    :param videos: list of videos
+    :param now: refresh date
     """
-    videos_statistics = []
-    iterations_ = len(objects)
+    intervals = settings.VIDEO_STATISTICS_REFRESH_INTERVALS
+    settlement_lead = timezone.timedelta(seconds=settings.VIDEO_STATISTICS_SETTLEMENT_LEAD)
+    rental_expirations = dict(
+        Rent.objects.filter(
+            state=RentState.ACTIVE, auction__video_id__in=[v.id for v in videos if v.state == VideoState.RENTED]
+        ).values_list("auction__video_id", "auction__rental_expiration_date")
+    )
+    for v in videos:
+        next_refresh = now + timezone.timedelta(seconds=intervals[VideoState(v.state).label])
+        before_settlement = rental_expirations[v.id] - settlement_lead if v.id in rental_expirations else None
+        if before_settlement is not None and now < before_settlement < next_refresh:
+            next_refresh = before_settlement
+        v.next_statistics_refresh = next_refresh
+
 
-    for i in range(result_limit, iterations_ + result_limit, result_limit):
-        upper_limit = iterations_ if i > iterations_ else i
-        videos_id_str = ",".join([x.link for x in objects[i - result_limit : upper_limit]])
-        response = youtube.videos().list(id=videos_id_str, part="statistics").execute()
-        videos_statistics.extend(response["items"])
+def loyalty_tiers(max_level=6, cash_base: int = 500, interval_base: int = 30) -> List[Tuple[Optional[int], int, int]]:
+    """
+    Specifies loyalty degrees as ranges of days since user registration.
 
-    return videos_statistics
+    :param interval_base: multiplicity of these intervals determines nex stages
+    :param cash_base: multiplicity of these intervals determines nex cash payouts
+    :param max_level: loyalty max level
+    :return: triples of days lower bound (inclusive, None for first tier), days upper bound (exclusive) and payout
+    """
+    loyalty_payout = [cash_base * i for i in range(1, max_level)]
+    loyalty_period = [interval_base * i for i in range(max_level)]
+    return list(zip([None] + loyalty_period, loyalty_period, loyalty_payout))
 
 
 def choose_loyalty_degree(days: int, max_level=6, cash_base: int = 500, interval_base: int = 30) -> int:
@@ -66,19 +309,105 @@ def choose_loyalty_degree(days: int, max_level=6, cash_base: int = 500, interval
     :param max_level: loyalty max level
     :return: payout value
     """
-    loyalty_payout = [cash_base * i for i in range(1, max_level)]
-    loyalty_period = [interval_base * i for i in range(max_level)] + [sys.maxsize]
-    for p, v in zip(loyalty_period, loyalty_payout):
-        if days < p:
-            return v
+    for _, max_days, payout in loyalty_tiers(max_level, cash_base, interval_base):
+        if days < max_days:
+            return payout
     return 0
 
 
-def deactivate_rent(rent: Rent, views_diff: int) -> None:
+def loyalty_period_reference(now: datetime) -> str:
+    """
+    Identifies loyalty payout period containing given moment, periods last LOYALTY_PAYOUT_PERIOD seconds.
+
+    :return: ledger reference of payouts in period
+    """
+    period = timezone.timedelta(seconds=settings.LOYALTY_PAYOUT_PERIOD)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    start = epoch + (now - epoch) // period * period
+    return f"loyalty:{start:%Y-%m-%dT%H:%M}"
+
+
+def pay_loyalty(users: QuerySet, payout: int, reference: str, chunk_size: int = 10000) -> int:
     """
-    Deactivate rent in system
+    Pays loyalty payout to users not paid yet in period identified by reference.
 
+    Users are paid in chunks, each chunk in one transaction: one select of ids, one bulk insert of ledger entries
+    and one update of cash. Users paid in period are skipped, so repeated call never pays twice.
+
+    :param users: users to pay
+    :param payout: paid cash
+    :param reference: ledger reference of payout period
+    :param chunk_size: users paid in one transaction
+    :return: number of paid users
     """
-    rent.state = "inactive"
-    rent.profit = views_diff - rent.auction.last_bid_value
-    rent.save()
+    paid = CashLedger.objects.filter(
+        user_id=OuterRef("pk"), operation=CashOperation.LOYALTY_PAYOUT, reference=reference
+    )
+    unpaid = users.filter(~Exists(paid)).order_by("pk").values_list("pk", flat=True)
+    last_id, count = None, 0
+    while True:
+        with transaction.atomic():
+            ids = list((unpaid.filter(pk__gt=last_id) if last_id else unpaid)[:chunk_size])
+            if not ids:
+                break
+            CashLedger.objects.bulk_create(
+                CashLedger(user_id=user_id, amount=payout, operation=CashOperation.LOYALTY_PAYOUT, reference=reference)
+                for user_id in ids
+            )
+            User.objects.filter(id__in=ids).update(cash=F("cash") + payout)
+        count += len(ids)
+        last_id = ids[-1]
+    return count
+
+
+def settle_rents(rents: List[Rent]) -> int:
+    """
+    Settle rents in bulk
+            - computes views difference (rent start, rent end) of each rented video, no difference when views
+              on rent start or end are unknown
+            - increases users cash by views difference, recorded in ledger, one aggregated update per user
+            - sets rents to inactive and computes their profit
+            - resets videos to available
+
+    All changes are made in one transaction. Rents are claimed by conditional update switching only still active
+    ones to inactive, rents settled (or being settled) concurrently are skipped, so periodic settler and scheduled
+    settlement never settle rent twice, also on backends without row locks.
+
+    :param rents: rents to settle, with `auction` and `auction.video` selected
+    :return: number of settled rents
+    """
+    with transaction.atomic():
+        active = Rent.objects.filter(id__in=[r.id for r in rents], state=RentState.ACTIVE)
+        # rents being settled concurrently are skipped without waiting, where database supports it
+        claimed = set(active.select_for_update(skip_locked=True).values_list("id", flat=True))
+        if active.filter(id__in=claimed).update(state=RentState.INACTIVE) != len(claimed):
+            # settled concurrently between select and update, possible on backends without row locks
+            transaction.set_rollback(True)
+            return 0
+        rents = [r for r in rents if r.id in claimed]
+
+        credits = []
+        for r in rents:
+            a, v = r.auction, r.auction.video
+            if a.video_views_on_sold is None or v.views is None:
+                # missing views snapshot would turn whole video lifetime views into payout
+                logger.warning("Rent #%s settled without payout, video views unknown on sale or on settlement.", r.id)
+                views_diff = 0
+            else:
+                views_diff = v.views - a.video_views_on_sold
+            credits.append(
+                CashLedger(
+                    user_id=r.user_id,
+                    amount=views_diff,
+                    operation=CashOperation.RENT_SETTLEMENT,
+                    reference=f"rent:{r.id}",
+                )
+            )
+            r.state = RentState.INACTIVE
+            r.profit = views_diff - a.last_bid_value
+
+        move_cash(credits)
+        Video.objects.filter(id__in=[r.auction.video_id for r in rents]).update(state=VideoState.AVAILABLE)
+        Rent.objects.bulk_update(rents, ["profit"])
+    observe_lags(RENT_SETTLEMENT_LAG, [r.auction.rental_expiration_date for r in rents], timezone.now())
+    return len(rents)
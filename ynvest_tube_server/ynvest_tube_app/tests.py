@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Optional
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ynvest_tube_server.asgi import application
+from ynvest_tube_server.ynvest_tube_app.events import RedisBroker
+from ynvest_tube_server.ynvest_tube_app.models import (
+    Auction,
+    AuctionState,
+    CashLedger,
+    CashOperation,
+    Rent,
+    RentState,
+    User,
+    Video,
+    VideoState,
+)
+from ynvest_tube_server.ynvest_tube_app.tasks_service import settle_rents
+from ynvest_tube_server.ynvest_tube_app.views_helpers import shared
+from ynvest_tube_server.ynvest_tube_app.views_helpers.bid import RETRYABLE_STATUS, place_bid
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    EVENTS_BROKER="ynvest_tube_server.ynvest_tube_app.events.InMemoryBroker",
+)
+class ConcurrentBidsTest(TransactionTestCase):
+    """
+    Bids placed concurrently on the same auctions by the same users never create nor lose cash.
+
+    """
+
+    users_count, auctions_count, threads_count, bids_per_thread = 5, 3, 8, 30
+    # lost races are repeated, as clients are advised to
+    retries = 20
+
+    def setUp(self) -> None:
+        self.users = [User.objects.create() for _ in range(self.users_count)]
+        CashLedger.objects.bulk_create(
+            CashLedger(user=u, amount=u.cash, operation=CashOperation.OPENING_BALANCE) for u in self.users
+        )
+        now = timezone.now()
+        self.auctions = [
+            Auction.objects.create(
+                starting_price=10,
+                video=Video.objects.create(title=f"Video {i}", link=f"link-{i}", views=1000),
+                rental_duration=timezone.timedelta(hours=1),
+                auction_expiration_date=now + timezone.timedelta(hours=1),
+                rental_expiration_date=now + timezone.timedelta(hours=2),
+            )
+            for i in range(self.auctions_count)
+        ]
+        self.initial_cash = sum(u.cash for u in self.users)
+
+    def place_bids(self, barrier: threading.Barrier, bid_values: itertools.count, statuses: list) -> None:
+        rng = random.Random()
+        barrier.wait()
+        try:
+            for _ in range(self.bids_per_thread):
+                # values grow, so bids mostly outbid previous ones until users run out of cash
+                auction_id, user_id = rng.choice(self.auctions).id, str(rng.choice(self.users).id)
+                value = next(bid_values) * 7
+                for _ in range(self.retries):
+                    _, status = place_bid(auction_id, user_id, value)
+                    if status != RETRYABLE_STATUS:
+                        break
+                    time.sleep(rng.uniform(0, 0.005))
+                statuses.append(status)
+        finally:
+            connection.close()
+
+    def test_concurrent_bids_conserve_cash(self) -> None:
+        barrier = threading.Barrier(self.threads_count)
+        bid_values, statuses = itertools.count(2), []
+        threads = [
+            threading.Thread(target=self.place_bids, args=(barrier, bid_values, statuses))
+            for _ in range(self.threads_count)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(statuses), self.threads_count * self.bids_per_thread)
+        self.assertIn(200, statuses)
+        self.assertLessEqual(set(statuses), {200, 400, RETRYABLE_STATUS})
+
+        users_cash = User.objects.aggregate(total=Sum("cash"))["total"]
+        locked_bids = Auction.objects.filter(last_bidder__isnull=False).aggregate(total=Sum("last_bid_value"))
+        self.assertEqual(users_cash + (locked_bids["total"] or 0), self.initial_cash)
+        self.assertFalse(User.objects.filter(cash__lt=0).exists())
+        # ledger replays to the same balances
+        ledger = dict(
+            CashLedger.objects.values("user_id").annotate(total=Sum("amount")).values_list("user_id", "total")
+        )
+        self.assertEqual(ledger, dict(User.objects.values_list("id", "cash")))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ListsPaginationTest(TestCase):
+    """
+    Every list of endpoints returning several lists is walked to its end through its own cursor.
+
+    """
+
+    limit = 4
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        user = User.objects.create()
+        now = timezone.now()
+        states = [VideoState.AUCTIONED, VideoState.RENTED, VideoState.AVAILABLE]
+        videos = [
+            Video.objects.create(title=f"Video {i}", link=f"link-{i}", state=states[i % 5 % 3]) for i in range(30)
+        ]
+        for i, v in enumerate(videos[:20]):
+            auction = Auction.objects.create(
+                state=AuctionState.ACTIVE if i % 3 else AuctionState.INACTIVE,
+                starting_price=10,
+                video=v,
+                rental_duration=timezone.timedelta(hours=1),
+                auction_expiration_date=now + timezone.timedelta(hours=1),
+                rental_expiration_date=now + timezone.timedelta(hours=2),
+            )
+            Rent.objects.create(auction=auction, user=user, state=RentState.ACTIVE if i % 4 else RentState.INACTIVE)
+
+    def walk(self, path: str, key: str) -> list:
+        response = self.client.get(path, {"limit": self.limit})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        ids = [row["id"] for row in data[key]]
+        while data["cursors"][key] is not None:
+            response = self.client.get(path, {"limit": self.limit, "list": key, "after": data["cursors"][key]})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            # only paged list is returned
+            self.assertEqual(set(data["cursors"]), {key})
+            ids.extend(row["id"] for row in data[key])
+        return ids
+
+    def test_each_list_is_walked_to_its_end(self) -> None:
+        lists = {
+            "/videos": {
+                "auctionedVideos": Video.objects.filter(state=VideoState.AUCTIONED),
+                "rentedVideos": Video.objects.filter(state=VideoState.RENTED),
+                "availableVideos": Video.objects.filter(state=VideoState.AVAILABLE),
+            },
+            "/rents": {
+                "activeRents": Rent.objects.filter(state=RentState.ACTIVE),
+                "inactiveRents": Rent.objects.filter(state=RentState.INACTIVE),
+            },
+            "/auctions": {
+                "activeAuctions": Auction.objects.filter(state=AuctionState.ACTIVE),
+                "inactiveAuctions": Auction.objects.filter(state=AuctionState.INACTIVE),
+            },
+        }
+        for path, query_sets in lists.items():
+            for key, query_set in query_sets.items():
+                with self.subTest(path=path, list=key):
+                    expected = list(query_set.order_by("pk").values_list("pk", flat=True))
+                    self.assertGreater(len(expected), self.limit)
+                    self.assertEqual(self.walk(path, key), expected)
+
+    def test_after_requires_list(self) -> None:
+        self.assertEqual(self.client.get("/videos", {"after": 1}).status_code, 400)
+        self.assertEqual(self.client.get("/rents", {"list": "allRents"}).status_code, 400)
+
+
+class AsgiExportTest(TransactionTestCase):
+    """
+    Exports served through ASGI application stream all rows, chunks are read outside of event loop.
+
+    """
+
+    def setUp(self) -> None:
+        Video.objects.bulk_create(Video(title=f"Video {i}", link=f"link-{i}", views=i) for i in range(25))
+
+    @async_to_sync
+    async def export(self, path: str, query_string: bytes) -> tuple:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query_string,
+            "root_path": "",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        communicator = ApplicationCommunicator(application, scope)
+        await communicator.send_input({"type": "http.request", "body": b""})
+        start = await communicator.receive_output(timeout=10)
+        body = b""
+        while True:
+            message = await communicator.receive_output(timeout=10)
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await communicator.wait()
+        return start, body
+
+    def test_videos_export_through_asgi(self) -> None:
+        # several chunks
+        with mock.patch.object(shared, "EXPORT_CHUNK_SIZE", 10):
+            start, body = self.export("/videos", b"format=ndjson&fields=views")
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"application/x-ndjson"), start["headers"])
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["views"] for row in rows], list(range(25)))
+        self.assertEqual(set(rows[0]), {"id", "views"})
+
+    def test_wrong_params_through_asgi(self) -> None:
+        start, _ = self.export("/rents", b"format=ndjson&limit=0")
+        self.assertEqual(start["status"], 400)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SettleRentsTest(TestCase):
+    """
+    Rents are credited once and only with views gained during rent.
+
+    """
+
+    def create_due_rent(self, views_on_sold: Optional[int]) -> User:
+        user = User.objects.create(cash=0)
+        now = timezone.now()
+        auction = Auction.objects.create(
+            state=AuctionState.INACTIVE,
+            starting_price=10,
+            last_bidder=user,
+            last_bid_value=20,
+            video=Video.objects.create(title="Video", link=f"link-{user.id}", views=1500, state=VideoState.RENTED),
+            rental_duration=timezone.timedelta(hours=1),
+            auction_expiration_date=now - timezone.timedelta(hours=2),
+            rental_expiration_date=now - timezone.timedelta(hours=1),
+            video_views_on_sold=views_on_sold,
+        )
+        Rent.objects.create(auction=auction, user=user)
+        return user
+
+    def test_rent_is_settled_once(self) -> None:
+        user = self.create_due_rent(1000)
+        # both settlers read rent before any of them settles it
+        first, second = (list(Rent.objects.select_related("auction__video")) for _ in range(2))
+
+        self.assertEqual(settle_rents(first), 1)
+        self.assertEqual(settle_rents(second), 0)
+        self.assertEqual(User.objects.get(id=user.id).cash, 500)
+        self.assertEqual(CashLedger.objects.filter(operation=CashOperation.RENT_SETTLEMENT).count(), 1)
+
+    def test_rent_without_views_on_sold_is_not_paid(self) -> None:
+        user = self.create_due_rent(None)
+
+        with self.assertLogs("ynvest_tube_server.ynvest_tube_app.tasks_service", "WARNING"):
+            self.assertEqual(settle_rents(list(Rent.objects.select_related("auction__video"))), 1)
+        self.assertEqual(User.objects.get(id=user.id).cash, 0)
+        self.assertEqual(Rent.objects.get(user=user).profit, -20)
+
+
+class RedisBrokerTest(TestCase):
+    """
+    Events listener outlives failures of redis channel and keeps delivering events.
+
+    """
+
+    def test_listener_resubscribes_after_failure(self) -> None:
+        broker = RedisBroker("redis://localhost:6379/0", "events")
+        failing, working = mock.Mock(), mock.Mock()
+        failing.listen.side_effect = ValueError("malformed reply")
+
+        def messages():
+            # second subscription delivers one message to subscriber and stays connected
+            while not broker._subscriptions:
+                time.sleep(0.01)
+            yield {"data": b"event"}
+            threading.Event().wait()
+
+        working.listen.side_effect = messages
+
+        @async_to_sync
+        async def receive() -> bytes:
+            subscription = broker.subscribe()
+            try:
+                return await asyncio.wait_for(subscription.get(), timeout=10)
+            finally:
+                subscription.close()
+
+        with mock.patch.object(broker.redis, "pubsub", side_effect=[failing, working]), mock.patch(
+            "ynvest_tube_server.ynvest_tube_app.events.time.sleep"
+        ), self.assertLogs("ynvest_tube_server.ynvest_tube_app.events", "ERROR"):
+            self.assertEqual(receive(), b"event")
+        failing.close.assert_called_once()
@@ -28,6 +28,8 @@ urlpatterns = [
     path("bids", views.get_bids, name="get_bids"),
     path("users", views.get_users, name="get_users"),
     path("auctions/<int:auction_id>/close", views.close_auction, name="close_auction"),
+    path("auctions/cache", views.get_auctions_cache_statistics, name="get_auctions_cache_statistics"),
+    path("metrics", views.get_metrics, name="get_metrics"),
     path("videos", views.get_videos, name="get_videos"),
     path("videos/random-insert", views.insert_youtube_videos, name="insert_youtube_videos"),
     path("rents", views.get_rents, name="get_rents"),
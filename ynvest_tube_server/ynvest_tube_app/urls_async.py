@@ -0,0 +1,16 @@
+"""
+URL configuration of application served through ASGI, same as `urls` but with async views where there are ones.
+
+"""
+from django.urls import path
+
+from . import urls, views_async
+
+ASYNC_VIEWS = {
+    "get_user": views_async.get_user,
+    "get_user_details": views_async.get_user_details,
+    "get_auctions": views_async.get_auctions,
+    "get_auction": views_async.get_auction,
+}
+
+urlpatterns = [path(str(p.pattern), ASYNC_VIEWS.get(p.name, p.callback), name=p.name) for p in urls.urlpatterns]
@@ -1,119 +1,135 @@
 import random
-from typing import Optional
+from typing import Optional, Union
 
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import JsonResponse
-from django.shortcuts import redirect
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from ynvest_tube_server.settings import youtube
-from ynvest_tube_server.ynvest_tube_app.models import User, Auction, Rent, Video, Bids
-from ynvest_tube_server.ynvest_tube_app.tasks_service import set_video, assign_rent
-from ynvest_tube_server.ynvest_tube_app.views_helpers.auction import (
-    extend_auctions_data,
-    specify_relation,
-    check_auction_post_request_requirements,
-    settle_auctioneers,
+from ynvest_tube_server.ynvest_tube_app.models import (
+    User,
+    Auction,
+    AuctionState,
+    CashLedger,
+    CashOperation,
+    Rent,
+    RentState,
+    Video,
+    VideoState,
+    Bids,
 )
-from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import load_data_from, serialize_query_set
-from ynvest_tube_server.ynvest_tube_app.views_helpers.video import get_random_words, fix_punctuation_marks
+from ynvest_tube_server.ynvest_tube_app.auctions_cache import get_cache_statistics, invalidate_auctions_on_commit
+from ynvest_tube_server.ynvest_tube_app.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, load_snapshots
+from ynvest_tube_server.ynvest_tube_app.serializers import serialize
+from ynvest_tube_server.ynvest_tube_app.tasks import insert_youtube_videos as insert_youtube_videos_task
+from ynvest_tube_server.ynvest_tube_app.tasks import schedule_rents_settlement
+from ynvest_tube_server.ynvest_tube_app.tasks_service import close_auctions
+from ynvest_tube_server.ynvest_tube_app.views_helpers.auction import AUCTIONS_LISTS, auction_data, auctions_data
+from ynvest_tube_server.ynvest_tube_app.views_helpers.bid import place_bid, RETRYABLE_STATUS
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import (
+    FastJsonResponse,
+    export_ndjson,
+    is_export_request,
+    load_data_from,
+    load_page_params,
+    serialize_pages,
+    wrong_page_params_data,
+)
+from ynvest_tube_server.ynvest_tube_app.views_helpers.user import user_data, user_details_data
+
+
+# responses are built per request, as middlewares set headers on them
+def wrong_method_response() -> FastJsonResponse:
+    return FastJsonResponse({"summary": "Used request method is not allowed for this endpoint."}, status=405)
+
 
-wrong_method_response = JsonResponse({"summary": "Used request method is not allowed for this endpoint."}, status=405)
+def user_not_found_response() -> FastJsonResponse:
+    return FastJsonResponse({"summary": "User not found."}, status=404)
 
 
-def register_user(request: WSGIRequest) -> Optional[JsonResponse]:
+def auction_not_found_response() -> FastJsonResponse:
+    return FastJsonResponse({"summary": "Auction not found."}, status=404)
+
+
+def register_user(request: WSGIRequest) -> Optional[FastJsonResponse]:
     """
     Register new user in database. ( uuid generator)
 
     """
     if request.method == "GET":
-        new_user = User()
-        new_user.save()
+        with transaction.atomic():
+            new_user = User()
+            new_user.save()
+            CashLedger.objects.create(user=new_user, amount=new_user.cash, operation=CashOperation.OPENING_BALANCE)
         data = {
             "summary": "Successfully registered new user",
             "userId": new_user.id,
         }
-        return JsonResponse(data, status=200)
-    return wrong_method_response
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
 
 
 @csrf_exempt
-def get_user(request: WSGIRequest) -> JsonResponse:
+def get_user(request: WSGIRequest) -> FastJsonResponse:
     """
     Gets specified user.
 
     :param request: wsgi request
     """
     if request.method == "POST":
-        user_id = load_data_from(request, "UserId")
-        u = User.objects.all().filter(id=user_id).first()
-        data = {"summary": "Get user", "user": u.serialize()}
-        return JsonResponse(data, status=200)
-    return wrong_method_response
+        data = user_data(load_data_from(request, "UserId"))
+        if data is None:
+            return user_not_found_response()
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
 
 
 @csrf_exempt
-def get_user_details(request: WSGIRequest) -> Optional[JsonResponse]:
+def get_user_details(request: WSGIRequest) -> Optional[FastJsonResponse]:
     """
     Display detailed data about user
             - cash
             - attendingAuctions - all auctions that user actually participate in
-            - rents - history
+            - actualRents - active rents
+            - expiredRents - one page of rents history, query string may contain pagination parameters
+            - statistics - total profit and number of all rents
 
     """
     if request.method == "POST":
-        user_id = load_data_from(request, "UserId")
-
-        # auctions in which user participate at the moment
-        u = User.objects.all().filter(id=user_id).first()
-        auctions = Auction.objects.all().filter(last_bidder=u, state="active")
-
-        # user rents
-        active_rents = Rent.objects.filter(user=u, state="active")
-        inactive_rents = Rent.objects.filter(user=u, state="inactive")
-
-        data = {
-            "summary": "Get user actual auctions and all his rents.",
-            "cash": u.cash,
-            "attendingAuctions": serialize_query_set(auctions),  # wrong name need to be changed
-            "actualRents": serialize_query_set(active_rents),
-            "expiredRents": serialize_query_set(inactive_rents),
-        }
-        return JsonResponse(data, status=200)
-    return wrong_method_response
+        try:
+            params = load_page_params(request, Rent)
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        data = user_details_data(load_data_from(request, "UserId"), params)
+        if data is None:
+            return user_not_found_response()
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
 
 
 @csrf_exempt
-def get_auctions(request: WSGIRequest) -> JsonResponse:
+def get_auctions(request: WSGIRequest) -> FastJsonResponse:
     """
-    List all auctions existed in database.
+    List auctions existed in database, one page of active and inactive ones.
 
-    """
-    if request.method == "POST":
-        auctions = Auction.objects.all()
-        user_id = load_data_from(request, "UserId")
-
-        data = {
-            "summary": "Get all auctions",
-            "activeAuctions": extend_auctions_data(auctions.filter(state="active"), user_id),
-            "inactiveAuctions": serialize_query_set(auctions.filter(state="inactive")),
-        }
-        return JsonResponse(data, status=200, safe=False)
+    Query string may contain keyset pagination parameters `after`, `limit` and `fields`.
+    Pages are read through cache, user contribution is added on top of cached pages.
 
-    if request.method == "GET":
-        auctions = Auction.objects.all()
+    """
+    if request.method not in ("GET", "POST"):
+        return wrong_method_response()
+    try:
+        params = load_page_params(request, Auction, AUCTIONS_LISTS)
+    except ValueError as error:
+        return FastJsonResponse(wrong_page_params_data(error), status=400)
 
-        data = {
-            "summary": "Get all auctions",
-            "activeAuctions": serialize_query_set(auctions.filter(state="active")),
-            "inactiveAuctions": serialize_query_set(auctions.filter(state="inactive")),
-        }
-        return JsonResponse(data, status=200, safe=False)
-    return wrong_method_response
+    with_contribution = request.method == "POST"
+    user_id = load_data_from(request, "UserId") if with_contribution else None
+    return FastJsonResponse(auctions_data(params, user_id, with_contribution), status=200, safe=False)
 
 
 @csrf_exempt
-def get_auction(request: WSGIRequest, auction_id: int) -> JsonResponse:
+def get_auction(request: WSGIRequest, auction_id: int) -> FastJsonResponse:
     """
     On GET request returns specific auction
 
@@ -123,57 +139,42 @@ def get_auction(request: WSGIRequest, auction_id: int) -> JsonResponse:
     :param auction_id: auction id
 
     """
-    auction_query = Auction.objects.all().filter(id=auction_id)
-    auction = auction_query.first()
     if request.method == "POST":
-        user_id = load_data_from(request, "UserId")
-        auction_bidders = Bids.objects.all().filter(auction=auction).values_list("user").distinct()
-        serialized_auction = auction.serialize()
-        serialized_auction["user_contribution"] = specify_relation((auction, user_id))
-
-        data = {
-            "summary": "Get auction",
-            "auctionBiddersCount": int(auction_bidders.count()),
-            "auction": serialized_auction,
-        }
-
-        return JsonResponse(data, status=200)
+        data = auction_data(auction_id, load_data_from(request, "UserId"))
+        if data is None:
+            return auction_not_found_response()
+        return FastJsonResponse(data, status=200)
 
     elif request.method == "PUT":
         user_id, bid_value = load_data_from(request, "UserId", "bidValue")
-        user_query = User.objects.all().filter(id=user_id)
-        error_response, error_status = check_auction_post_request_requirements(auction, user_query, bid_value)
-        if error_response and error_status:
-            return JsonResponse(error_response, status=error_status)
-        else:
-            u = user_query.first()
-            Bids(auction=auction, user=u, value=bid_value).save()
-            settle_auctioneers(u, auction, bid_value)
-            auction.last_bidder = u
-            auction.last_bid_value = bid_value
-            auction.save()
-            data = {"summary": "Successfully bid on auction", "auction": auction.serialize()}
-            return JsonResponse(data, status=200)
-    return wrong_method_response
+        data, status = place_bid(auction_id, user_id, bid_value)
+        response = FastJsonResponse(data, status=status)
+        if status == RETRYABLE_STATUS:
+            response["Retry-After"] = 1
+        return response
+    return wrong_method_response()
 
 
 ##################################################### DEVELOPMENT ######################################################
 
 
-def get_users(request: WSGIRequest) -> JsonResponse:
+def get_users(request: WSGIRequest) -> FastJsonResponse:
     """
     List all users in database.
 
     """
     if request.method == "GET":
-        qs = User.objects.all()
-        data = {"summary": "Get all users", "users": serialize_query_set(qs)}
-        return JsonResponse(data, status=200, safe=False)
-    return wrong_method_response
+        try:
+            params = load_page_params(request, User)
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        data = {"summary": "Get all users", **serialize_pages({"users": User.objects.all()}, params)}
+        return FastJsonResponse(data, status=200, safe=False)
+    return wrong_method_response()
 
 
 @csrf_exempt
-def insert_expired_rent(request: WSGIRequest) -> JsonResponse:
+def insert_expired_rent(request: WSGIRequest) -> FastJsonResponse:
     """
     Insert expired rent for user.
 
@@ -192,7 +193,7 @@ def insert_expired_rent(request: WSGIRequest) -> JsonResponse:
         rtd = timezone.timedelta(days=random.randint(1, 10))
         views_on_sold = v.views - random.randint(int(v.views * 0.75), int(v.views * 0.9))
         a = Auction(
-            state="inactive",
+            state=AuctionState.INACTIVE,
             starting_price=sp,
             last_bid_value=sp + 1,
             last_bidder=u,
@@ -203,119 +204,145 @@ def insert_expired_rent(request: WSGIRequest) -> JsonResponse:
             video_views_on_sold=views_on_sold,
         )
         a.save()
-        r = Rent(user=u, auction=a, state="inactive", profit=v.views - views_on_sold - sp + 1)
+        r = Rent(user=u, auction=a, state=RentState.INACTIVE, profit=v.views - views_on_sold - sp + 1)
         r.save()
         b = Bids(auction=a, user=u, value=sp + 1)
         b.save()
+        invalidate_auctions_on_commit()
         data = {
             "summary": "Inserted expired rent for user.",
-            "user": u.serialize(),
-            "auction": a.serialize(),
-            "rent": r.serialize(),
-            "bid": b.serialize(),
+            "user": serialize(u),
+            "auction": serialize(a),
+            "rent": serialize(r),
+            "bid": serialize(b),
         }
-        return JsonResponse(data, status=200)
-    return wrong_method_response
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
 
 
-def get_videos(request: WSGIRequest) -> JsonResponse:
+def get_videos(request: WSGIRequest) -> Union[FastJsonResponse, StreamingHttpResponse]:
     """
     List all videos existing in database.
 
+    With `format=ndjson` all videos are streamed as newline delimited json.
     """
     if request.method == "GET":
         videos = Video.objects.all()
-        data = {
-            "summary": "Get all videos",
-            "auctionedVideos": serialize_query_set(videos.filter(state="auctioned")),
-            "rentedVideos": serialize_query_set(videos.filter(state="rented")),
-            "availableVideos": serialize_query_set(videos.filter(state="available")),
+        lists = {
+            "auctionedVideos": videos.filter(state=VideoState.AUCTIONED),
+            "rentedVideos": videos.filter(state=VideoState.RENTED),
+            "availableVideos": videos.filter(state=VideoState.AVAILABLE),
         }
-        return JsonResponse(data, status=200, safe=False)
-    return wrong_method_response
-
-
-def get_bids(request: WSGIRequest) -> JsonResponse:
+        try:
+            params = load_page_params(request, Video, tuple(lists))
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        if is_export_request(request):
+            return export_ndjson(videos, params)
+        data = {"summary": "Get all videos", **serialize_pages(lists, params)}
+        return FastJsonResponse(data, status=200, safe=False)
+    return wrong_method_response()
+
+
+def get_bids(request: WSGIRequest) -> Union[FastJsonResponse, StreamingHttpResponse]:
     """
     List all bids existing in database.
 
+    With `format=ndjson` all bids are streamed as newline delimited json.
     """
     if request.method == "GET":
-        bids = Bids.objects.all()
-        data = {
-            "summary": "Get all bids",
-            "allBids": serialize_query_set(bids),
-        }
-        return JsonResponse(data, status=200, safe=False)
-    return wrong_method_response
-
-
-def get_rents(request: WSGIRequest) -> JsonResponse:
+        try:
+            params = load_page_params(request, Bids)
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        if is_export_request(request):
+            return export_ndjson(Bids.objects.all(), params)
+        data = {"summary": "Get all bids", **serialize_pages({"allBids": Bids.objects.all()}, params)}
+        return FastJsonResponse(data, status=200, safe=False)
+    return wrong_method_response()
+
+
+def get_rents(request: WSGIRequest) -> Union[FastJsonResponse, StreamingHttpResponse]:
     """
     List all rents existing in database.
 
+    With `format=ndjson` all rents are streamed as newline delimited json.
     """
     if request.method == "GET":
-        active_rents = Rent.objects.all().filter(state="active")
-        inactive_rents = Rent.objects.all().filter(state="inactive")
-        data = {
-            "summary": "Get all rents",
-            "activeRents": serialize_query_set(active_rents),
-            "inactiveRents": serialize_query_set(inactive_rents),
+        rents = Rent.objects.all()
+        lists = {
+            "activeRents": rents.filter(state=RentState.ACTIVE),
+            "inactiveRents": rents.filter(state=RentState.INACTIVE),
         }
-        return JsonResponse(data, status=200, safe=False)
-    return wrong_method_response
+        try:
+            params = load_page_params(request, Rent, tuple(lists))
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        if is_export_request(request):
+            return export_ndjson(rents, params)
+        data = {"summary": "Get all rents", **serialize_pages(lists, params)}
+        return FastJsonResponse(data, status=200, safe=False)
+    return wrong_method_response()
 
 
 @csrf_exempt
-def insert_youtube_videos(request: WSGIRequest):
+def insert_youtube_videos(request: WSGIRequest) -> FastJsonResponse:
     """
-    Insert multiple random youtube videos to database
+    Enqueues insertion of multiple random youtube videos to database
 
-    :return: redirect to videos list
+    :return: id of insertion job
     """
-    print("Inserting videos...")
-    args = get_random_words(n=5)
-    for el in args:
-        req = youtube.search().list(q=el, part="snippet", type="video")
-        snippets = req.execute()
-        videos_id_string = ",".join([x["id"]["videoId"] for x in snippets["items"]])
-
-        video_statistics = youtube.videos().list(id=videos_id_string, part="statistics")
-        stats = video_statistics.execute()
-        for v_snip, v_stats in zip(snippets["items"], stats["items"]):
-            v = Video(
-                title=fix_punctuation_marks(v_snip["snippet"]["title"]),
-                description=fix_punctuation_marks(v_snip["snippet"]["description"]),
-                link=v_snip["id"]["videoId"],
-                likes=v_stats["statistics"]["likeCount"],
-                views=v_stats["statistics"]["viewCount"],
-                dislikes=v_stats["statistics"]["dislikeCount"],
-            )
-            v.save()
-
-        print(f'Inserted videos{[fix_punctuation_marks(v["snippet"]["title"]) for v in snippets["items"]]}')
-
-    return redirect("get_videos")
-
-
-def close_auction(request: WSGIRequest, auction_id: int) -> JsonResponse:
+    job = insert_youtube_videos_task.delay()
+    data = {"summary": "Videos insertion enqueued.", "jobId": job.id}
+    return FastJsonResponse(data, status=202)
+
+
+def close_auction(request: WSGIRequest, auction_id: int) -> FastJsonResponse:
     """
-    Closes auction.
+    Closes active auction, closing auction which is already closed ends with 409.
 
     """
     if request.method == "DELETE":
-        a = Auction.objects.all().filter(id=auction_id).first()
-        a.state = "inactive"
-        if a.last_bidder is not None:
-            set_video(a.video, "rented")
-            assign_rent(a)
-        else:
-            set_video(a.video, "available")
-        a.save()
+        with transaction.atomic():
+            a = Auction.objects.select_for_update(of=("self",)).select_related("video").filter(id=auction_id).first()
+            if a is None:
+                return auction_not_found_response()
+            was_active = a.state == AuctionState.ACTIVE
+            won = close_auctions([a]) if was_active else []
+        if not was_active or a.state != AuctionState.INACTIVE:
+            # closed before or concurrently, by periodic closer or scheduled closing
+            return FastJsonResponse({"summary": "Auction is already closed.", "auctionId": auction_id}, status=409)
+        schedule_rents_settlement(won)
         data = {
             "summary": "Auction closed. Transaction saved in database.",
-            "auction": a.serialize(),
+            "auction": serialize(a),
+        }
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
+
+
+def get_auctions_cache_statistics(request: WSGIRequest) -> FastJsonResponse:
+    """
+    Show auctions cache hits and misses counters.
+
+    """
+    if request.method == "GET":
+        data = {"summary": "Auctions cache statistics", **get_cache_statistics()}
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
+
+
+def get_metrics(request: WSGIRequest) -> HttpResponse:
+    """
+    Show requests metrics of this process, celery workers tasks metrics and auctions cache counters
+    in prometheus text format.
+
+    """
+    if request.method == "GET":
+        statistics = get_cache_statistics()
+        counters = {
+            "ynvest_auctions_cache_hits_total": statistics["hits"],
+            "ynvest_auctions_cache_misses_total": statistics["misses"],
         }
-        return JsonResponse(data, status=200)
-    return wrong_method_response
+        return HttpResponse(REGISTRY.render(counters, load_snapshots()), content_type=PROMETHEUS_CONTENT_TYPE)
+    return wrong_method_response()
@@ -0,0 +1,109 @@
+"""
+Async counterparts of read heavy views, routed instead of sync ones when application is served through ASGI.
+
+Django ORM has no async interface yet, so database work of each request is done by one call awaited
+with `database_sync_to_async`.
+"""
+from typing import Callable
+
+from django.http import HttpRequest
+
+from ynvest_tube_server.ynvest_tube_app.models import Auction, Rent
+from ynvest_tube_server.ynvest_tube_app.views import (
+    auction_not_found_response,
+    user_not_found_response,
+    wrong_method_response,
+)
+from ynvest_tube_server.ynvest_tube_app.views_helpers.auction import AUCTIONS_LISTS, auction_data, auctions_data
+from ynvest_tube_server.ynvest_tube_app.views_helpers.bid import place_bid, RETRYABLE_STATUS
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import (
+    FastJsonResponse,
+    database_sync_to_async,
+    load_data_from,
+    load_page_params,
+    wrong_page_params_data,
+)
+from ynvest_tube_server.ynvest_tube_app.views_helpers.user import user_data, user_details_data
+
+
+def csrf_exempt(view: Callable) -> Callable:
+    """
+    Marks async view as exempt from CSRF protection, `django.views.decorators.csrf.csrf_exempt` wraps views
+    in sync function.
+
+    """
+    view.csrf_exempt = True
+    return view
+
+
+@csrf_exempt
+async def get_user(request: HttpRequest) -> FastJsonResponse:
+    """
+    Gets specified user.
+
+    """
+    if request.method == "POST":
+        data = await database_sync_to_async(user_data)(load_data_from(request, "UserId"))
+        if data is None:
+            return user_not_found_response()
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
+
+
+@csrf_exempt
+async def get_user_details(request: HttpRequest) -> FastJsonResponse:
+    """
+    Display detailed data about user, see `views.get_user_details`.
+
+    """
+    if request.method == "POST":
+        try:
+            params = load_page_params(request, Rent)
+        except ValueError as error:
+            return FastJsonResponse(wrong_page_params_data(error), status=400)
+        data = await database_sync_to_async(user_details_data)(load_data_from(request, "UserId"), params)
+        if data is None:
+            return user_not_found_response()
+        return FastJsonResponse(data, status=200)
+    return wrong_method_response()
+
+
+@csrf_exempt
+async def get_auctions(request: HttpRequest) -> FastJsonResponse:
+    """
+    List auctions existed in database, one page of active and inactive ones, see `views.get_auctions`.
+
+    """
+    if request.method not in ("GET", "POST"):
+        return wrong_method_response()
+    try:
+        params = load_page_params(request, Auction, AUCTIONS_LISTS)
+    except ValueError as error:
+        return FastJsonResponse(wrong_page_params_data(error), status=400)
+
+    with_contribution = request.method == "POST"
+    user_id = load_data_from(request, "UserId") if with_contribution else None
+    data = await database_sync_to_async(auctions_data)(params, user_id, with_contribution)
+    return FastJsonResponse(data, status=200, safe=False)
+
+
+@csrf_exempt
+async def get_auction(request: HttpRequest, auction_id: int) -> FastJsonResponse:
+    """
+    On POST request returns specific auction, on PUT request bids on it, see `views.get_auction`.
+
+    """
+    if request.method == "POST":
+        data = await database_sync_to_async(auction_data)(auction_id, load_data_from(request, "UserId"))
+        if data is None:
+            return auction_not_found_response()
+        return FastJsonResponse(data, status=200)
+
+    elif request.method == "PUT":
+        user_id, bid_value = load_data_from(request, "UserId", "bidValue")
+        data, status = await database_sync_to_async(place_bid)(auction_id, user_id, bid_value)
+        response = FastJsonResponse(data, status=status)
+        if status == RETRYABLE_STATUS:
+            response["Retry-After"] = 1
+        return response
+    return wrong_method_response()
@@ -1,68 +1,106 @@
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
 
 from django.db.models import QuerySet
 from django.utils import timezone
 
-from ynvest_tube_server.ynvest_tube_app.models import Auction, Bids, User
-from ynvest_tube_server.ynvest_tube_app.tasks_service import settle_user
+from ynvest_tube_server.ynvest_tube_app.auctions_cache import get_auctions_page
+from ynvest_tube_server.ynvest_tube_app.models import Auction, AuctionState, Bids, User
+from ynvest_tube_server.ynvest_tube_app.serializers import serialize
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import PageParams, next_cursor
 
-
-def settle_auctioneers(user: User, auction: Auction, bid_value: int) -> None:
-    """
-    Every bid triggers
-        - current bidder cash reduction,
-        - reimbursement to the previous user (last bidder)
-
-    :param user: currently bidding user
-    :param auction: aimed auction
-    :param bid_value: new bid value of current user (piercing bid)
-    """
-    settle_user(user, -bid_value)
-    if auction.last_bidder:
-        settle_user(auction.last_bidder, auction.last_bid_value)
+AUCTIONS_LISTS = ("activeAuctions", "inactiveAuctions")
 
 
-def specify_relation(*args) -> int:
+def specify_relations(last_bidders: Dict[int, Optional[UUID]], user_id: str) -> Dict[int, int]:
     """
-    Specify relation between auction and user.
+    Specify relation between user and each auction.
 
     Possible results
         0 - had not participated in auction,
         1 - user had bid in auction, but is not winning
         2 - user is winning auction (biggest bid)
 
-    It may be one liner but its not simply readable.
+    Auctions that user had bid on are fetched with a single query, so cost does not depend on auctions count.
+
+    :param last_bidders: dict with auction id as key and its last bidder id as value
+    :param user_id: UUID
+    :return: dict with auction id as key and relation code as value
     """
-    result = []
-    for tup in args:
-        auction, user_id = tup
-        user = User.objects.all().filter(id=user_id).first()
-        had_participated = Bids.objects.all().filter(auction=auction, user=user)
-        if had_participated:
-            is_winning = user == auction.last_bidder
-            if is_winning:
-                result.append(2)
-            else:
-                result.append(1)
+    user_id = User._meta.pk.to_python(user_id) if user_id is not None else None
+    participated = set()
+    if user_id is not None and last_bidders:
+        participated = set(
+            Bids.objects.filter(user_id=user_id, auction_id__in=list(last_bidders))
+            .values_list("auction_id", flat=True)
+            .distinct()
+        )
+
+    result = {}
+    for auction_id, last_bidder_id in last_bidders.items():
+        if auction_id not in participated:
+            result[auction_id] = 0
+        elif last_bidder_id == user_id:
+            result[auction_id] = 2
         else:
-            result.append(0)
-    return result if len(result) > 1 else result.pop()
+            result[auction_id] = 1
+    return result
 
 
-def extend_auctions_data(query_set: QuerySet, user_id: str) -> List:
+def overlay_user_contribution(auctions: List[Tuple[Dict, Optional[UUID]]], user_id: str) -> List:
     """
-    Extends auction details by user contribution state.
+    Copies serialized auctions extended by user contribution state, serialized auctions are not modified.
 
-    :param query_set: list of auctions
+    :param auctions: serialized auctions with ids of their last bidders
     :param user_id: UUID
     :return:  list of auctions extended by their relation with user
     """
-    result = []
-    for a in query_set:
-        auction_serialized = a.serialize()
-        auction_serialized["user_contribution"] = specify_relation((a, user_id))
-        result.append(auction_serialized)
-    return result
+    relations = specify_relations({a["id"]: last_bidder_id for a, last_bidder_id in auctions}, user_id)
+    return [{**a, "user_contribution": relations[a["id"]]} for a, _ in auctions]
+
+
+def auctions_data(params: PageParams, user_id: Optional[str], with_contribution: bool) -> Dict:
+    """
+    Collects page of active and inactive auctions, or only of paged list when `list` parameter is given.
+
+    :param params: pagination parameters
+    :param user_id: UUID
+    :param with_contribution: if true active auctions are extended by their relation with user
+    :return: response data
+    """
+    data, cursors = {"summary": "Get all auctions"}, {}
+    if params.selects("activeAuctions"):
+        active = get_auctions_page(AuctionState.ACTIVE, params)
+        active = overlay_user_contribution(active, user_id) if with_contribution else [a for a, _ in active]
+        data["activeAuctions"], cursors["activeAuctions"] = active, next_cursor(active, params)
+    if params.selects("inactiveAuctions"):
+        inactive = [a for a, _ in get_auctions_page(AuctionState.INACTIVE, params)]
+        data["inactiveAuctions"], cursors["inactiveAuctions"] = inactive, next_cursor(inactive, params)
+    data["cursors"] = cursors
+    return data
+
+
+def auction_data(auction_id: int, user_id: str) -> Optional[Dict]:
+    """
+    Collects auction details extended by its relation with user.
+
+    :param auction_id: auction id
+    :param user_id: UUID
+    :return: response data, None if auction does not exist
+    """
+    auction = Auction.objects.select_related("video").filter(id=auction_id).first()
+    if auction is None:
+        return None
+    auction_bidders = Bids.objects.filter(auction=auction).values_list("user").distinct()
+    serialized_auction = serialize(auction)
+    serialized_auction["user_contribution"] = specify_relations({auction.id: auction.last_bidder_id}, user_id)[
+        auction.id
+    ]
+    return {
+        "summary": "Get auction",
+        "auctionBiddersCount": int(auction_bidders.count()),
+        "auction": serialized_auction,
+    }
 
 
 ############################# validators #######################################
@@ -110,7 +148,7 @@ def check_auction_post_request_requirements(auction: Auction, user_query: QueryS
     Requirements:
 
         - user must be registered in database
-        - auction must be active
+        - auction must be active and not expired
 
     :param auction: aimed auction
     :param user_query: query of users with special uuid
@@ -119,7 +157,7 @@ def check_auction_post_request_requirements(auction: Auction, user_query: QueryS
     """
     data, status = {}, 0
     # check if auction expired
-    if auction.auction_expiration_date < timezone.now():
+    if auction.state != AuctionState.ACTIVE or auction.auction_expiration_date < timezone.now():
         data["summary"] = "Auction expired."
         data["expirationDate"] = auction.auction_expiration_date
         return data, 404
@@ -0,0 +1,102 @@
+from typing import Dict, Tuple
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from ynvest_tube_server.ynvest_tube_app.auctions_cache import invalidate_auctions_on_commit
+from ynvest_tube_server.ynvest_tube_app.events import publish_event
+from ynvest_tube_server.ynvest_tube_app.models import Auction, AuctionState, Bids, CashLedger, CashOperation, User
+from ynvest_tube_server.ynvest_tube_app.serializers import serialize
+from ynvest_tube_server.ynvest_tube_app.views_helpers.auction import check_auction_post_request_requirements
+
+# status returned when bid lost a race with another one, client should simply repeat request
+RETRYABLE_STATUS = 409
+
+
+class BidConflict(Exception):
+    """
+    Raised when auction or user row has been changed by concurrent request during bid placement.
+
+    """
+
+
+def _conflict_response(auction_id: int, bid_value: int) -> Tuple[Dict, int]:
+    data = {
+        "summary": "Auction is being bid by other users.",
+        "auctionId": auction_id,
+        "bidValue": bid_value,
+        "errorMessage": "Concurrent bid detected, retry request.",
+    }
+    return data, RETRYABLE_STATUS
+
+
+def place_bid(auction_id: int, user_id: str, bid_value: int) -> Tuple[Dict, int]:
+    """
+    Places bid on auction in one transaction.
+
+    Every bid triggers
+        - bid registration,
+        - current bidder cash reduction,
+        - reimbursement to the previous user (last bidder),
+        - both cash movements recorded in ledger,
+        - auction last bidder and last bid value change.
+
+    Auction and user rows are locked with `select_for_update(nowait=True)` where database supports it.
+    Independently auction is changed by conditional update (compare and swap on last bid) and cash by `F()`
+    arithmetic, so a lost race is detected on every backend and whole transaction is rolled back.
+    Contention never waits, it ends with RETRYABLE_STATUS.
+
+    :param auction_id: aimed auction id
+    :param user_id: currently bidding user UUID
+    :param bid_value: new bid value of current user (piercing bid)
+    :return: response data and status
+    """
+    try:
+        with transaction.atomic():
+            auction = (
+                Auction.objects.select_for_update(nowait=True).select_related("video").filter(id=auction_id).first()
+            )
+            if auction is None:
+                return {"summary": "Auction not found.", "auctionId": auction_id}, 404
+
+            user_query = User.objects.select_for_update(nowait=True).filter(id=user_id)
+            error_response, error_status = check_auction_post_request_requirements(auction, user_query, bid_value)
+            if error_response and error_status:
+                return error_response, error_status
+
+            previous_bidder_id, previous_bid_value = auction.last_bidder_id, auction.last_bid_value
+            swapped = Auction.objects.filter(
+                id=auction_id,
+                state=AuctionState.ACTIVE,
+                last_bidder_id=previous_bidder_id,
+                last_bid_value=previous_bid_value,
+            ).update(last_bidder_id=user_id, last_bid_value=bid_value)
+            if not swapped:
+                raise BidConflict()
+
+            if not User.objects.filter(id=user_id, cash__gte=bid_value).update(cash=F("cash") - bid_value):
+                raise BidConflict()
+            reference = f"auction:{auction_id}"
+            movements = [
+                CashLedger(user_id=user_id, amount=-bid_value, operation=CashOperation.BID, reference=reference)
+            ]
+            if previous_bidder_id is not None:
+                User.objects.filter(id=previous_bidder_id).update(cash=F("cash") + previous_bid_value)
+                movements.append(
+                    CashLedger(
+                        user_id=previous_bidder_id,
+                        amount=previous_bid_value,
+                        operation=CashOperation.REFUND,
+                        reference=reference,
+                    )
+                )
+            CashLedger.objects.bulk_create(movements)
+
+            Bids.objects.create(auction_id=auction_id, user_id=user_id, value=bid_value)
+            invalidate_auctions_on_commit()
+            publish_event({"type": "bid", "auction": auction_id, "lastBidValue": bid_value})
+    except (BidConflict, DatabaseError):
+        return _conflict_response(auction_id, bid_value)
+
+    auction.last_bidder_id, auction.last_bid_value = User._meta.pk.to_python(user_id), bid_value
+    return {"summary": "Successfully bid on auction", "auction": serialize(auction)}, 200
@@ -1,8 +1,46 @@
 import json
-from typing import Union, List, Dict
+from typing import Any, Callable, Iterator, NamedTuple, Optional, Sequence, Tuple, Type, Union, List, Dict
 
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, models
 from django.db.models import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+
+from ynvest_tube_server.ynvest_tube_app.metrics import measure_serialization
+from ynvest_tube_server.ynvest_tube_app.serializers import ModelSerializer, dumps, serializer_for
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+# rows fetched from database at once and written to response at once by exports
+EXPORT_CHUNK_SIZE = 2000
+
+
+class PageParams(NamedTuple):
+    after: Optional[Any]
+    limit: int
+    serializer: ModelSerializer
+    # key of paged list of endpoint returning several lists, all of them (first pages) if None
+    paged_list: Optional[str] = None
+
+    def selects(self, key: str) -> bool:
+        return self.paged_list is None or self.paged_list == key
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse counterpart encoding data with fast json encoder.
+
+    """
+
+    def __init__(self, data, safe: bool = True, **kwargs) -> None:
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        with measure_serialization():
+            content = dumps(data)
+        super().__init__(content=content, **kwargs)
 
 
 def load_data_from(request: WSGIRequest, *args: str) -> Union[List, str, int]:
@@ -19,9 +57,149 @@ def load_data_from(request: WSGIRequest, *args: str) -> Union[List, str, int]:
 
 def serialize_query_set(query_set: QuerySet) -> List[Dict]:
     """
-    Serializes whole query set to list of dicts
+    Serializes whole query set to list of dicts with compiled serializer of its model.
 
     :param query_set: django query set ( 'list' of rows from table )
     :return: list of dictionaries representing database models
     """
-    return [obj.serialize() for obj in query_set]
+    return serializer_for(query_set.model).serialize_query_set(query_set)
+
+
+def load_page_params(request: WSGIRequest, model: Type[models.Model], lists: Sequence[str] = ()) -> PageParams:
+    """
+    Load keyset pagination parameters from request query string.
+
+        - after - id of last row on previous page, first page if missing
+        - limit - page size, between 1 and MAX_PAGE_LIMIT
+        - fields - comma separated fields included in response, `id` is always included
+        - list - key of paged list, required with `after` by endpoints returning several lists,
+          only that list is returned then
+
+    :param model: listed model
+    :param lists: keys of lists returned by endpoint returning several lists
+    :return: pagination parameters with serializer projected on selected fields
+    :raises ValueError: on malformed parameters
+    """
+    try:
+        after = request.GET.get("after")
+        after = model._meta.pk.to_python(after) if after else None
+        limit = int(request.GET.get("limit", DEFAULT_PAGE_LIMIT))
+    except (ValidationError, ValueError):
+        raise ValueError("`after` must be an id and `limit` a number.")
+    if not 0 < limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"`limit` must be between 1 and {MAX_PAGE_LIMIT}.")
+    fields = [f for f in request.GET.get("fields", "").split(",") if f]
+
+    paged_list = request.GET.get("list") if lists else None
+    if paged_list is not None and paged_list not in lists:
+        raise ValueError(f"`list` must be one of: {', '.join(lists)}.")
+    # each list has its own cursor, exports ignore lists
+    if len(lists) > 1 and after is not None and paged_list is None and not is_export_request(request):
+        raise ValueError(f"`after` must be given with `list`, one of: {', '.join(lists)}.")
+    return PageParams(after, limit, serializer_for(model).project(fields), paged_list)
+
+
+def wrong_page_params_data(error: ValueError) -> Dict:
+    return {"summary": "Wrong pagination parameters.", "errorMessage": str(error)}
+
+
+def paginate(query_set: QuerySet, params: PageParams) -> QuerySet:
+    """
+    Limits query set to one page ordered by id.
+
+    """
+    query_set = query_set.order_by("pk")
+    if params.after is not None:
+        query_set = query_set.filter(pk__gt=params.after)
+    return query_set[: params.limit]
+
+
+def next_cursor(page: List[Dict], params: PageParams) -> Optional[Any]:
+    """
+    Returns `after` value of next page or None if page is the last one.
+
+    """
+    return page[-1]["id"] if len(page) == params.limit else None
+
+
+def serialize_pages(query_sets: Dict[str, QuerySet], params: PageParams) -> Dict:
+    """
+    Serializes one page of each query set, or only of paged list when `list` parameter is given.
+
+    :param query_sets: query sets by response key
+    :param params: pagination parameters
+    :return: dict with page of each query set and `cursors` dict containing next page `after` of each one
+    """
+    data, cursors = {}, {}
+    for key, query_set in query_sets.items():
+        if not params.selects(key):
+            continue
+        data[key] = params.serializer.serialize_query_set(paginate(query_set, params))
+        cursors[key] = next_cursor(data[key], params)
+    data["cursors"] = cursors
+    return data
+
+
+def is_export_request(request: WSGIRequest) -> bool:
+    return request.GET.get("format") == "ndjson"
+
+
+def export_chunk(query_set: QuerySet, params: PageParams, after: Optional[Any]) -> Tuple[bytes, Optional[Any]]:
+    """
+    Serializes chunk of EXPORT_CHUNK_SIZE rows following `after` as newline delimited json.
+
+    Each chunk is read with its own keyset query, so chunks may be read by different threads (async exports).
+
+    :param query_set: exported rows
+    :param params: pagination parameters, `limit` is ignored
+    :param after: id of last row of previous chunk, None for first chunk
+    :return: lines of chunk and `after` of next chunk, None if chunk is the last one
+    """
+    if after is not None:
+        query_set = query_set.filter(pk__gt=after)
+    rows = [row for row, _ in params.serializer.iter_serialized(query_set.order_by("pk")[:EXPORT_CHUNK_SIZE])]
+    lines = b"".join(dumps(row) + b"\n" for row in rows)
+    return lines, rows[-1]["id"] if len(rows) == EXPORT_CHUNK_SIZE else None
+
+
+def export_ndjson(query_set: QuerySet, params: PageParams) -> StreamingHttpResponse:
+    """
+    Streams whole query set as newline delimited json, one row per line, ordered by id.
+
+    Rows are read from database in chunks and encoded while response is sent, so memory usage does not
+    depend on rows count. `after` and `fields` parameters are respected, `limit` is ignored.
+    Django iterates streamed responses synchronously, so under ASGI exports are served by `streams.ndjson_export`.
+
+    :param query_set: exported rows
+    :param params: pagination parameters
+    :return: streaming response
+    """
+
+    def lines() -> Iterator[bytes]:
+        after = params.after
+        while True:
+            chunk, after = export_chunk(query_set, params, after)
+            yield chunk
+            if after is None:
+                break
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+def database_sync_to_async(function: Callable) -> Callable:
+    """
+    Wraps blocking function using database to be awaited in async views.
+
+    Function is run in executor thread, not in one thread shared by all requests (thread_sensitive mode),
+    so concurrent requests do not wait for each other. Stale database connections of executor thread are closed
+    before and after call, like around each request in sync views.
+    """
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from ynvest_tube_server.ynvest_tube_app.models import Auction, AuctionState, Rent, RentState, User
+from ynvest_tube_server.ynvest_tube_app.serializers import serialize
+from ynvest_tube_server.ynvest_tube_app.views_helpers.shared import (
+    PageParams,
+    next_cursor,
+    paginate,
+    serialize_query_set,
+)
+
+
+def user_data(user_id: str) -> Optional[Dict]:
+    """
+    Collects user data.
+
+    :param user_id: UUID
+    :return: response data, None if user does not exist
+    """
+    u = User.objects.filter(id=user_id).first()
+    if u is None:
+        return None
+    return {"summary": "Get user", "user": serialize(u)}
+
+
+def user_details_data(user_id: str, params: PageParams) -> Optional[Dict]:
+    """
+    Collects user cash, auctions that user actually participates in, rents and rents statistics.
+
+    Each collection is fetched with one query joining auctions and videos, expired rents (history growing
+    with account age) are paginated with `params`. Statistics cover all user rents.
+
+    :param user_id: UUID
+    :param params: pagination parameters of expired rents
+    :return: response data, None if user does not exist
+    """
+    u = User.objects.filter(id=user_id).first()
+    if u is None:
+        return None
+
+    # auctions in which user participate at the moment
+    auctions = Auction.objects.filter(last_bidder=u, state=AuctionState.ACTIVE).order_by("pk")
+
+    # user rents
+    rents = Rent.objects.filter(user=u)
+    active_rents = rents.filter(state=RentState.ACTIVE).order_by("pk")
+    expired_rents = params.serializer.serialize_query_set(paginate(rents.filter(state=RentState.INACTIVE), params))
+    statistics = rents.aggregate(
+        totalProfit=Coalesce(Sum("profit"), 0),
+        rentsCount=Count("pk"),
+        expiredRentsCount=Count("pk", filter=Q(state=RentState.INACTIVE)),
+    )
+
+    return {
+        "summary": "Get user actual auctions and all his rents.",
+        "cash": u.cash,
+        "attendingAuctions": serialize_query_set(auctions),  # wrong name need to be changed
+        "actualRents": serialize_query_set(active_rents),
+        "expiredRents": expired_rents,
+        "statistics": statistics,
+        "cursors": {"expiredRents": next_cursor(expired_rents, params)},
+    }
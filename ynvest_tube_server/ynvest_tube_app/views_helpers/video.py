@@ -1,29 +1,50 @@
+import html
 import random
-from typing import List
+from typing import List, Optional
 
 import requests
+from django.conf import settings
+from django.core.cache import cache
 
+WORD_LIST_CACHE_KEY = "videos:word-list"
 
-def get_random_words(n: int, word_site: str = "https://www.mit.edu/~ecprice/wordlist.10000") -> List[str]:
+
+def load_word_list(word_site: Optional[str] = None) -> List[str]:
+    """
+    Returns english dictionary, downloaded once and kept in cache shared by all processes.
+
+    :param word_site: url of dictionary with one word per line, by default WORD_LIST_URL
+    :return: list of words
+    :raises ValueError: if dictionary is empty
+    """
+    words = cache.get(WORD_LIST_CACHE_KEY)
+    if words is None:
+        response = requests.get(word_site or settings.WORD_LIST_URL, timeout=30)
+        response.raise_for_status()
+        words = response.text.split()
+        if not words:
+            raise ValueError("Downloaded word list is empty.")
+        cache.set(WORD_LIST_CACHE_KEY, words, timeout=None)
+    return words
+
+
+def get_random_words(n: int) -> List[str]:
     """
-    Returns random words from word_site
+    Returns random words from cached english dictionary
 
-    :param n: quantity of random words
-    :param word_site: english dictionary
-    :return: list of random words from word_site
+    :param n: quantity of random words, whole dictionary at most
+    :return: list of random words
     """
-    response = requests.get(word_site)
-    result = [x.decode("utf-8") for x in random.sample(list(response.content.splitlines()), n)]
-    return get_random_words(n) if not result else result
+    words = load_word_list()
+    return random.sample(words, min(n, len(words)))
 
 
-def fix_punctuation_marks(text: str) -> str:
+def fix_punctuation_marks(text: Optional[str]) -> Optional[str]:
     """
-    Changing not parsed quotes and ampersands to correct form.
+    Changing html entities returned by youtube api (e.g. `&quot;`, `&#39;`, `&amp;`, `&lt;`) to characters
+    in single pass.
 
     :param text: string containing not parsed symbols
-    :return: string with parsed & and '
+    :return: string with parsed entities
     """
-    text = text.replace("&quot;", '"')
-    text = text.replace("&#39;", '"')
-    return text.replace("&amp;", "&")
+    return html.unescape(text) if text else text
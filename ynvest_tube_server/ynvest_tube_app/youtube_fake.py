@@ -0,0 +1,74 @@
+import random
+import time
+from typing import Dict, Iterable, Optional
+
+
+class _FakeRequest:
+    def __init__(self, response: Dict, latency: float) -> None:
+        self.response = response
+        self.latency = latency
+
+    def execute(self) -> Dict:
+        time.sleep(self.latency)
+        return self.response
+
+
+class _FakeVideos:
+    def __init__(self, client: "FakeYoutubeClient") -> None:
+        self.client = client
+
+    def list(self, id: str, part: str) -> _FakeRequest:
+        items = [
+            {"id": video_id, "statistics": self.client.statistics(video_id)}
+            for video_id in id.split(",")
+            if video_id not in self.client.deleted
+        ]
+        return _FakeRequest({"items": items}, self.client.latency)
+
+
+class _FakeSearch:
+    def __init__(self, client: "FakeYoutubeClient") -> None:
+        self.client = client
+
+    def list(self, q: str, part: str, type: str, maxResults: int = 5) -> _FakeRequest:
+        items = [
+            {"id": {"videoId": f"{q}-{i}"}, "snippet": {"title": f"{q} video {i}", "description": f"About {q}."}}
+            for i in range(maxResults)
+        ]
+        return _FakeRequest({"items": items}, self.client.latency)
+
+
+class FakeYoutubeClient:
+    """
+    Offline stand-in for youtube data api v3 client, answers `videos().list(...)` and `search().list(...)` requests.
+
+    Statistics are deterministic for each video id, videos listed in `deleted` are omitted in responses
+    like youtube does with removed videos.
+    """
+
+    def __init__(self, latency: float = 0.05, deleted: Optional[Iterable[str]] = None) -> None:
+        self.latency = latency
+        self.deleted = set(deleted or ())
+
+    def statistics(self, video_id: str) -> Dict:
+        rng = random.Random(video_id)
+        views = rng.randint(1_000, 10_000_000)
+        return {
+            "viewCount": str(views),
+            "likeCount": str(views // rng.randint(20, 50)),
+            "dislikeCount": str(views // rng.randint(200, 500)),
+        }
+
+    def videos(self) -> _FakeVideos:
+        return _FakeVideos(self)
+
+    def search(self) -> _FakeSearch:
+        return _FakeSearch(self)
+
+
+def build_fake_youtube_client() -> FakeYoutubeClient:
+    """
+    Factory usable as YOUTUBE_CLIENT_FACTORY for offline runs and benchmarks.
+
+    """
+    return FakeYoutubeClient()
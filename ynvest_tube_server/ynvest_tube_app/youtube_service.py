@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from ynvest_tube_server.api_config import api_key
+
+# youtube data api v3 limits result rows to 50
+YOUTUBE_RESULT_LIMIT = 50
+RETRYABLE_HTTP_STATUSES = {429, 500, 502, 503, 504}
+# 403 is retried only when rate limited, exceeded daily quota or forbidden request never recovers on retry
+RETRYABLE_FORBIDDEN_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket limiting requests rate.
+
+    Bucket is refilled with `rate` tokens per second up to `capacity` tokens, each request takes one token.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[int] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes one token, blocks until it is available.
+
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def build_youtube_client() -> Any:
+    """
+    Builds new youtube data api v3 client.
+
+    Clients are not thread safe, so every worker thread builds its own one.
+    """
+    return build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+
+
+def get_client_factory() -> Callable[[], Any]:
+    """
+    Returns youtube client factory configured by YOUTUBE_CLIENT_FACTORY setting.
+
+    """
+    return import_string(settings.YOUTUBE_CLIENT_FACTORY)
+
+
+def _error_reasons(error: HttpError) -> Set[str]:
+    try:
+        return {e["reason"] for e in json.loads(error.content)["error"]["errors"]}
+    except (ValueError, KeyError, TypeError):
+        return set()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        if error.resp.status == 403:
+            return bool(_error_reasons(error) & RETRYABLE_FORBIDDEN_REASONS)
+        return error.resp.status in RETRYABLE_HTTP_STATUSES
+    return isinstance(error, OSError)
+
+
+def _execute_with_retry(request_factory: Callable[[], Any], bucket: TokenBucket, retries: int, backoff: float) -> Dict:
+    """
+    Executes youtube api request, retries on transient errors with exponential backoff.
+
+    Every attempt, retries included, takes token from bucket.
+
+    :param request_factory: builds request to execute
+    :param bucket: requests rate limit
+    :param retries: how many times request may be repeated
+    :param backoff: first delay in seconds, doubled on each retry
+    :return: api response
+    """
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            return request_factory().execute()
+        except Exception as error:
+            if attempt == retries or not _is_retryable(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_videos_statistics(
+    links: Iterable[str],
+    client_factory: Optional[Callable[[], Any]] = None,
+    workers: Optional[int] = None,
+    rate: Optional[float] = None,
+    retries: Optional[int] = None,
+    backoff: float = 0.5,
+) -> Dict[str, Dict]:
+    """
+    Calls youtube API concurrently to collect statistics of videos identified by links.
+
+    Links are split into chunks of YOUTUBE_RESULT_LIMIT, chunks are requested by pool of `workers` threads
+    and requests rate is limited by token bucket. Videos omitted by youtube (e.g. deleted) are absent in result.
+
+    :param links: youtube videos ids
+    :param client_factory: builds youtube client, called once per worker thread, by default configured factory
+    :param workers: worker threads count, by default YOUTUBE_STATISTICS_WORKERS
+    :param rate: max requests per second, by default YOUTUBE_REQUESTS_PER_SECOND
+    :param retries: retries of single request, by default YOUTUBE_REQUEST_RETRIES
+    :param backoff: first retry delay in seconds
+    :return: dict with video id as key and its statistics as value
+    """
+    client_factory = client_factory or get_client_factory()
+    workers = workers or settings.YOUTUBE_STATISTICS_WORKERS
+    bucket = TokenBucket(rate or settings.YOUTUBE_REQUESTS_PER_SECOND)
+    retries = settings.YOUTUBE_REQUEST_RETRIES if retries is None else retries
+    local = threading.local()
+
+    links = list(links)
+    chunks = [links[i : i + YOUTUBE_RESULT_LIMIT] for i in range(0, len(links), YOUTUBE_RESULT_LIMIT)]
+
+    def fetch_chunk(chunk: List[str]) -> List[Dict]:
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        response = _execute_with_retry(
+            lambda: local.client.videos().list(id=",".join(chunk), part="statistics"), bucket, retries, backoff
+        )
+        return response["items"]
+
+    statistics = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for items in executor.map(fetch_chunk, chunks):
+            statistics.update((item["id"], item["statistics"]) for item in items)
+    return statistics
+
+
+def search_videos(
+    phrases: Iterable[str],
+    results_per_phrase: int = 5,
+    client_factory: Optional[Callable[[], Any]] = None,
+    workers: Optional[int] = None,
+    rate: Optional[float] = None,
+    retries: Optional[int] = None,
+    backoff: float = 0.5,
+) -> List[Dict]:
+    """
+    Searches youtube videos of each phrase concurrently and collects their statistics.
+
+    Every phrase costs search and statistics request, phrases are searched by pool of `workers` threads
+    and requests rate is limited by token bucket. Videos omitted in statistics response are skipped.
+
+    :param phrases: searched phrases
+    :param results_per_phrase: videos found per phrase, at most YOUTUBE_RESULT_LIMIT
+    :param client_factory: builds youtube client, called once per worker thread, by default configured factory
+    :param workers: worker threads count, by default YOUTUBE_STATISTICS_WORKERS
+    :param rate: max requests per second, by default YOUTUBE_REQUESTS_PER_SECOND
+    :param retries: retries of single request, by default YOUTUBE_REQUEST_RETRIES
+    :param backoff: first retry delay in seconds
+    :return: list of dicts with video `id`, `snippet` and `statistics`
+    """
+    client_factory = client_factory or get_client_factory()
+    workers = workers or settings.YOUTUBE_STATISTICS_WORKERS
+    bucket = TokenBucket(rate or settings.YOUTUBE_REQUESTS_PER_SECOND)
+    retries = settings.YOUTUBE_REQUEST_RETRIES if retries is None else retries
+    results_per_phrase = min(results_per_phrase, YOUTUBE_RESULT_LIMIT)
+    local = threading.local()
+
+    def search(phrase: str) -> List[Dict]:
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        found = _execute_with_retry(
+            lambda: local.client.search().list(q=phrase, part="snippet", type="video", maxResults=results_per_phrase),
+            bucket,
+            retries,
+            backoff,
+        )
+        snippets = {item["id"]["videoId"]: item["snippet"] for item in found["items"]}
+        if not snippets:
+            return []
+        stats = _execute_with_retry(
+            lambda: local.client.videos().list(id=",".join(snippets), part="statistics"), bucket, retries, backoff
+        )
+        return [
+            {"id": item["id"], "snippet": snippets[item["id"]], "statistics": item["statistics"]}
+            for item in stats["items"]
+            if item["id"] in snippets
+        ]
+
+    videos = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for found in executor.map(search, phrases):
+            videos.extend(found)
+    return videos